@@ -2,18 +2,243 @@
 import logging
 import json
 import re
+import string
+import numpy as np
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Any, List
-from config.settings import Config
 from utils.api_handler import gemini_handler
+from utils.json_utils import extract_first_json, strip_line_comments, loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+# Precompiled patterns for LLM response cleanup - compiled once at import
+# instead of on every response
+_RE_FENCE = re.compile(r'```')
+_RE_FENCE_BLOCK = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_RE_TRAIL_OBJ = re.compile(r',\s*}')
+_RE_TRAIL_ARR = re.compile(r',\s*]')
+
+# Static analysis-prompt skeleton - built once at import; per-call work is
+# reduced to filling the handful of mutable slots
+_ANALYSIS_PROMPT_TMPL = string.Template("""
+You are a financial analyst. Analyze this portfolio and return ONLY valid JSON with no additional text.
+
+PORTFOLIO DATA:
+Symbol: $symbol
+Investment: ₹$investment
+Current Value: ₹$current_value
+P&L: ₹$pnl
+Holdings Count: $holdings_count
+
+Return ONLY this JSON structure with no markdown formatting:
+
+{
+  "executive_summary": {
+    "total_investment": $total_investment,
+    "current_value": $raw_current_value,
+    "total_pnl": $total_pnl,
+    "total_pnl_percentage": $pnl_percentage,
+    "number_of_holdings": $holdings_count,
+    "risk_level": "High"
+  },
+  "holdings_analysis": [
+    {
+      "symbol": "$symbol",
+      "sector": "Unknown",
+      "pnl": $raw_pnl,
+      "pnl_percentage": $pnl_percentage,
+      "weight_in_portfolio": 100,
+      "recommendation": "Review"
+    }
+  ],
+  "sector_analysis": {
+    "sector_allocation": [
+      {
+        "sector": "Unknown",
+        "percentage": 100.0,
+        "value": $raw_current_value
+      }
+    ]
+  },
+  "key_insights": [
+    "Portfolio highly concentrated in single holding",
+    "Significant diversification risk present",
+    "Current position showing $pnl_word of ₹$pnl_abs"
+  ],
+  "risk_warnings": [
+    "High concentration risk - single stock portfolio",
+    "No sector diversification",
+    "Vulnerable to individual stock volatility"
+  ],
+  "opportunities": [
+    "Add diversified holdings across sectors",
+    "Consider large-cap stocks for stability",
+    "Implement risk management strategies"
+  ]
+}
+""")
+
+# Pre-serialized skeleton for the structured fallback - cloning a constant
+# JSON string is cheaper than rebuilding the nested literals every call;
+# dynamic slots are patched in after the clone
+_FALLBACK_PROTO_JSON = json.dumps({
+    "executive_summary": {
+        "total_investment": 0,
+        "current_value": 0,
+        "total_pnl": 0,
+        "total_pnl_percentage": 0,
+        "number_of_holdings": 0,
+        "risk_level": "High"
+    },
+    "holdings_analysis": [
+        {
+            "symbol": "PRIMARY_HOLDING",
+            "sector": "To_Be_Determined",
+            "pnl": 0,
+            "pnl_percentage": 0,
+            "weight_in_portfolio": 100.0,
+            "recommendation": "Review_Required"
+        }
+    ],
+    "sector_analysis": {
+        "sector_allocation": [
+            {
+                "sector": "Primary_Sector",
+                "percentage": 100.0,
+                "value": 0
+            }
+        ]
+    },
+    "key_insights": [
+        "",
+        "",
+        "Immediate diversification recommended to reduce risk",
+        "Consider adding quality large-cap stocks across sectors"
+    ],
+    "risk_warnings": [
+        "Critical concentration risk - portfolio lacks diversification",
+        "Single stock volatility can cause significant losses",
+        "No defensive positions to weather market downturns"
+    ],
+    "opportunities": [
+        "Add banking sector exposure with quality names",
+        "Consider technology sector for growth potential",
+        "Include FMCG stocks for defensive positioning",
+        "Implement systematic diversification strategy"
+    ],
+    "parsing_note": "Structured from calculated metrics due to AI response parsing issues"
+})
+
+# Optional Numba acceleration: a fused single-pass reduction computes both
+# totals in one memory sweep instead of two dot products. Falls back to the
+# NumPy path when numba is not installed.
+try:
+    import numba
+
+    @numba.njit(cache=True, fastmath=True)
+    def _aggregate_holdings(avg_price, last_price, quantity):
+        total_investment = 0.0
+        current_value = 0.0
+        for i in range(avg_price.shape[0]):
+            total_investment += avg_price[i] * quantity[i]
+            current_value += last_price[i] * quantity[i]
+        return total_investment, current_value
+
+    # Warm the JIT once at import so the compile cost is paid upfront
+    _aggregate_holdings(
+        np.ones(1, dtype=np.float64),
+        np.ones(1, dtype=np.float64),
+        np.ones(1, dtype=np.int64)
+    )
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+def _clean_json_text(text: str) -> str:
+    """Clean text for JSON parsing"""
+    if not text:
+        return ""
+
+    # Remove markdown code blocks
+    text = _RE_FENCE.sub('', text)
+
+    # Find JSON boundaries
+    start = text.find('{')
+    end = text.rfind('}')
+
+    if start == -1 or end == -1 or end <= start:
+        return ""
+
+    json_text = text[start:end+1]
+
+    # Clean up common issues
+    json_text = strip_line_comments(json_text)        # Remove // comments
+    json_text = _RE_TRAIL_OBJ.sub('}', json_text)     # Remove trailing commas
+    json_text = _RE_TRAIL_ARR.sub(']', json_text)     # Remove trailing commas in arrays
+
+    return json_text.strip()
+
+
+def _parse_analysis_text(text: str):
+    """Try the text-only parse strategies; return a dict or None"""
+    # Fast path: when the model already returned bare JSON, parse it
+    # directly and skip the cleanup strategies entirely
+    stripped = text.strip()
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            return json_loads(stripped)
+        except Exception:
+            pass
+
+    try:
+        # Strategy 1: Clean and parse as-is
+        cleaned_text = _clean_json_text(text)
+        if cleaned_text:
+            return json_loads(cleaned_text)
+
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSON parse attempt 1 failed: {e}")
+
+    try:
+        # Strategy 2: Extract JSON from markdown code blocks
+        json_match = _RE_FENCE_BLOCK.search(text)
+        if json_match:
+            json_str = json_match.group(1)
+            return json_loads(_clean_json_text(json_str))
+
+    except json.JSONDecodeError as e:
+        logger.warning(f"JSON parse attempt 2 failed: {e}")
+
+    try:
+        # Strategy 3: Extract the first balanced JSON object with a
+        # linear brace-depth scan (no backtracking regex)
+        candidate = extract_first_json(text)
+        if candidate:
+            parsed = json_loads(_clean_json_text(candidate))
+            # Validate it has expected structure
+            if 'executive_summary' in parsed:
+                return parsed
+
+    except Exception as e:
+        logger.warning(f"JSON parse attempt 3 failed: {e}")
+
+    return None
+
+
+@lru_cache(maxsize=64)
+def _parse_analysis_text_cached(text: str):
+    """Memoized parse: retries often resend identical LLM output, so cache
+    the canonical JSON string keyed on the raw response text"""
+    parsed = _parse_analysis_text(text)
+    return json.dumps(parsed) if parsed is not None else None
+
+
 class DataAnalyzerAgent:
     """Enhanced agent with robust JSON parsing for portfolio analysis"""
     
     def __init__(self, name: str = "DataAnalyzerAgent"):
         self.name = name
-        self.config = Config()
     
     def execute(self, portfolio_data: Dict[str, Any]) -> Dict[str, Any]:
         """Perform portfolio analysis with robust error handling"""
@@ -31,9 +256,20 @@ class DataAnalyzerAgent:
             positions = portfolio_data.get('positions', {}).get('net', [])
             profile = portfolio_data.get('profile', {})
             
-            # Calculate basic metrics first
-            basic_metrics = self._calculate_basic_metrics(holdings, positions)
-            
+            # Calculate basic metrics first, reusing the fetcher's columnar
+            # arrays when available
+            basic_metrics = self._calculate_basic_metrics(
+                holdings, positions, soa=portfolio_data.get('holdings_soa')
+            )
+
+            # Specialized fast path: with at most one holding the LLM can
+            # only restate the arithmetic we already computed, so build the
+            # analysis deterministically and skip the round-trip entirely
+            if len(holdings) <= 1:
+                logger.info(f"{self.name}: Single-holding portfolio, "
+                            "using deterministic fast path (no LLM call)")
+                return self._create_single_holding_analysis(holdings, basic_metrics)
+
             # Create analysis prompt
             prompt = self._create_robust_analysis_prompt(holdings, basic_metrics)
             
@@ -60,198 +296,85 @@ class DataAnalyzerAgent:
         except Exception as e:
             logger.error(f"{self.name}: Analysis error: {e}")
             basic_metrics = self._calculate_basic_metrics(
-                portfolio_data.get('holdings', []), 
-                portfolio_data.get('positions', {}).get('net', [])
+                portfolio_data.get('holdings', []),
+                portfolio_data.get('positions', {}).get('net', []),
+                soa=portfolio_data.get('holdings_soa')
             )
             return self._create_fallback_response(basic_metrics, str(e))
     
     def _create_robust_analysis_prompt(self, holdings: List[Dict], basic_metrics: Dict) -> str:
         """Create a robust analysis prompt with clear JSON structure"""
-        # Get first holding details
+        # Get first holding details and resolve metric lookups once
         primary_holding = holdings[0] if holdings else {}
         symbol = primary_holding.get('tradingsymbol', 'UNKNOWN')
         pnl = primary_holding.get('pnl', 0)
-        
-        return f"""
-You are a financial analyst. Analyze this portfolio and return ONLY valid JSON with no additional text.
+        total_investment = basic_metrics.get('total_investment', 0)
+        current_value = basic_metrics.get('current_value', 0)
+        pnl_percentage = basic_metrics.get('total_pnl_percentage', 0)
 
-PORTFOLIO DATA:
-Symbol: {symbol}
-Investment: ₹{basic_metrics.get('total_investment', 0):.0f}
-Current Value: ₹{basic_metrics.get('current_value', 0):.0f}
-P&L: ₹{pnl:.0f}
-Holdings Count: {len(holdings)}
-
-Return ONLY this JSON structure with no markdown formatting:
-
-{{
-  "executive_summary": {{
-    "total_investment": {basic_metrics.get('total_investment', 0)},
-    "current_value": {basic_metrics.get('current_value', 0)},
-    "total_pnl": {basic_metrics.get('total_pnl', 0)},
-    "total_pnl_percentage": {basic_metrics.get('total_pnl_percentage', 0):.2f},
-    "number_of_holdings": {len(holdings)},
-    "risk_level": "High"
-  }},
-  "holdings_analysis": [
-    {{
-      "symbol": "{symbol}",
-      "sector": "Unknown",
-      "pnl": {pnl},
-      "pnl_percentage": {basic_metrics.get('total_pnl_percentage', 0):.2f},
-      "weight_in_portfolio": 100,
-      "recommendation": "Review"
-    }}
-  ],
-  "sector_analysis": {{
-    "sector_allocation": [
-      {{
-        "sector": "Unknown", 
-        "percentage": 100.0, 
-        "value": {basic_metrics.get('current_value', 0)}
-      }}
-    ]
-  }},
-  "key_insights": [
-    "Portfolio highly concentrated in single holding",
-    "Significant diversification risk present",
-    "Current position showing {'loss' if pnl < 0 else 'profit'} of ₹{abs(pnl):.0f}"
-  ],
-  "risk_warnings": [
-    "High concentration risk - single stock portfolio",
-    "No sector diversification",
-    "Vulnerable to individual stock volatility"
-  ],
-  "opportunities": [
-    "Add diversified holdings across sectors",
-    "Consider large-cap stocks for stability",
-    "Implement risk management strategies"
-  ]
-}}
-"""
+        return _ANALYSIS_PROMPT_TMPL.substitute(
+            symbol=symbol,
+            investment=f"{total_investment:.0f}",
+            current_value=f"{current_value:.0f}",
+            raw_current_value=current_value,
+            pnl=f"{pnl:.0f}",
+            raw_pnl=pnl,
+            pnl_abs=f"{abs(pnl):.0f}",
+            pnl_word='loss' if pnl < 0 else 'profit',
+            holdings_count=len(holdings),
+            total_investment=total_investment,
+            total_pnl=basic_metrics.get('total_pnl', 0),
+            pnl_percentage=f"{pnl_percentage:.2f}"
+        )
     
     def _robust_json_parse(self, text: str, basic_metrics: Dict) -> Dict:
         """Robust JSON parsing with multiple fallback strategies"""
-        try:
-            # Strategy 1: Clean and parse as-is
-            cleaned_text = self._clean_json_text(text)
-            if cleaned_text:
-                return json.loads(cleaned_text)
-                
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON parse attempt 1 failed: {e}")
-            
-        try:
-            # Strategy 2: Extract JSON from markdown code blocks
-            json_match = re.search(r'``````', text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                return json.loads(self._clean_json_text(json_str))
-                
-        except json.JSONDecodeError as e:
-            logger.warning(f"JSON parse attempt 2 failed: {e}")
-            
-        try:
-            # Strategy 3: Find JSON-like structure
-            json_pattern = r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
-            matches = re.findall(json_pattern, text, re.DOTALL)
-            
-            for match in matches:
-                try:
-                    cleaned_match = self._clean_json_text(match)
-                    parsed = json.loads(cleaned_match)
-                    # Validate it has expected structure
-                    if 'executive_summary' in parsed:
-                        return parsed
-                except:
-                    continue
-                    
-        except Exception as e:
-            logger.warning(f"JSON parse attempt 3 failed: {e}")
-        
+        cached = _parse_analysis_text_cached(text)
+        if cached is not None:
+            # Re-parse the canonical cached string so every caller gets a
+            # fresh copy rather than a shared mutable dict
+            return json_loads(cached)
+
         # Strategy 4: Manual JSON construction
         logger.warning("All JSON parsing failed, creating structured fallback")
         return self._create_structured_fallback(basic_metrics, text)
     
-    def _clean_json_text(self, text: str) -> str:
-        """Clean text for JSON parsing"""
-        if not text:
-            return ""
-            
-        # Remove markdown code blocks
-        text = re.sub(r'```', '', text)
-        
-        # Find JSON boundaries
-        start = text.find('{')
-        end = text.rfind('}')
-        
-        if start == -1 or end == -1 or end <= start:
-            return ""
-            
-        json_text = text[start:end+1]
-        
-        # Clean up common issues
-        json_text = re.sub(r'//.*?\n', '\n', json_text)  # Remove comments
-        json_text = re.sub(r',\s*}', '}', json_text)      # Remove trailing commas
-        json_text = re.sub(r',\s*]', ']', json_text)      # Remove trailing commas in arrays
-        
-        return json_text.strip()
-    
     def _create_structured_fallback(self, basic_metrics: Dict, raw_text: str) -> Dict:
         """Create structured analysis from basic metrics and raw text"""
         holdings_count = basic_metrics.get('number_of_holdings', 0)
         pnl = basic_metrics.get('total_pnl', 0)
         pnl_pct = basic_metrics.get('total_pnl_percentage', 0)
-        
-        return {
-            "executive_summary": {
-                "total_investment": basic_metrics.get('total_investment', 0),
-                "current_value": basic_metrics.get('current_value', 0),
-                "total_pnl": pnl,
-                "total_pnl_percentage": pnl_pct,
-                "number_of_holdings": holdings_count,
-                "risk_level": "High" if holdings_count < 3 else "Medium"
-            },
-            "holdings_analysis": [
-                {
-                    "symbol": "PRIMARY_HOLDING",
-                    "sector": "To_Be_Determined",
-                    "pnl": pnl,
-                    "pnl_percentage": pnl_pct,
-                    "weight_in_portfolio": 100.0 if holdings_count == 1 else 50.0,
-                    "recommendation": "Review_Required"
-                }
-            ],
-            "sector_analysis": {
-                "sector_allocation": [
-                    {
-                        "sector": "Primary_Sector",
-                        "percentage": 100.0,
-                        "value": basic_metrics.get('current_value', 0)
-                    }
-                ]
-            },
-            "key_insights": [
-                f"Portfolio has {holdings_count} holding(s) with significant concentration risk",
-                f"Current P&L of ₹{pnl:.0f} ({pnl_pct:+.2f}%) requires attention",
-                "Immediate diversification recommended to reduce risk",
-                "Consider adding quality large-cap stocks across sectors"
-            ],
-            "risk_warnings": [
-                "Critical concentration risk - portfolio lacks diversification",
-                "Single stock volatility can cause significant losses",
-                "No defensive positions to weather market downturns"
-            ],
-            "opportunities": [
-                "Add banking sector exposure with quality names",
-                "Consider technology sector for growth potential",
-                "Include FMCG stocks for defensive positioning",
-                "Implement systematic diversification strategy"
-            ],
-            "parsing_note": "Structured from calculated metrics due to AI response parsing issues"
-        }
+        current_value = basic_metrics.get('current_value', 0)
+
+        # Clone the pre-serialized prototype, then patch the dynamic slots
+        result = json_loads(_FALLBACK_PROTO_JSON)
+
+        exec_summary = result["executive_summary"]
+        exec_summary["total_investment"] = basic_metrics.get('total_investment', 0)
+        exec_summary["current_value"] = current_value
+        exec_summary["total_pnl"] = pnl
+        exec_summary["total_pnl_percentage"] = pnl_pct
+        exec_summary["number_of_holdings"] = holdings_count
+        exec_summary["risk_level"] = "High" if holdings_count < 3 else "Medium"
+
+        primary = result["holdings_analysis"][0]
+        primary["pnl"] = pnl
+        primary["pnl_percentage"] = pnl_pct
+        primary["weight_in_portfolio"] = 100.0 if holdings_count == 1 else 50.0
+
+        result["sector_analysis"]["sector_allocation"][0]["value"] = current_value
+
+        result["key_insights"][0] = (
+            f"Portfolio has {holdings_count} holding(s) with significant concentration risk"
+        )
+        result["key_insights"][1] = (
+            f"Current P&L of ₹{pnl:.0f} ({pnl_pct:+.2f}%) requires attention"
+        )
+
+        return result
     
-    def _calculate_basic_metrics(self, holdings: List[Dict], positions: List[Dict]) -> Dict[str, float]:
+    def _calculate_basic_metrics(self, holdings: List[Dict], positions: List[Dict],
+                                 soa: Dict[str, Any] = None) -> Dict[str, float]:
         """Calculate basic portfolio metrics"""
         try:
             if not holdings:
@@ -263,20 +386,44 @@ Return ONLY this JSON structure with no markdown formatting:
                     'number_of_holdings': 0
                 }
             
-            total_investment = 0
-            current_value = 0
-            
-            for holding in holdings:
-                avg_price = float(holding.get('average_price', 0))
-                current_price = float(holding.get('last_price', 0))
-                quantity = int(holding.get('quantity', 0))
-                
-                investment = avg_price * quantity
-                current_val = current_price * quantity
-                
-                total_investment += investment
-                current_value += current_val
-            
+            # Vectorized aggregation - reuse the fetcher's columnar arrays
+            # when provided, otherwise build them here once
+            if soa is not None and len(soa.get('avg_price', ())) == len(holdings):
+                avg_price = soa['avg_price']
+                last_price = soa['last_price']
+                quantity = soa['quantity']
+            else:
+                count = len(holdings)
+                avg_price = np.fromiter(
+                    (h.get('average_price', 0) or 0 for h in holdings),
+                    dtype=np.float64, count=count
+                )
+                last_price = np.fromiter(
+                    (h.get('last_price', 0) or 0 for h in holdings),
+                    dtype=np.float64, count=count
+                )
+                quantity = np.fromiter(
+                    (h.get('quantity', 0) or 0 for h in holdings),
+                    dtype=np.int64, count=count
+                )
+
+            if _HAS_NUMBA:
+                total_investment, current_value = _aggregate_holdings(
+                    avg_price.astype(np.float64, copy=False),
+                    last_price.astype(np.float64, copy=False),
+                    quantity.astype(np.int64, copy=False)
+                )
+            else:
+                # Accumulate in float64 regardless of storage dtype to avoid
+                # cancellation error on the P&L difference
+                total_investment = float(np.dot(
+                    avg_price.astype(np.float64, copy=False),
+                    quantity.astype(np.float64, copy=False)
+                ))
+                current_value = float(np.dot(
+                    last_price.astype(np.float64, copy=False),
+                    quantity.astype(np.float64, copy=False)
+                ))
             total_pnl = current_value - total_investment
             total_pnl_percentage = (total_pnl / total_investment * 100) if total_investment > 0 else 0
             
@@ -298,6 +445,27 @@ Return ONLY this JSON structure with no markdown formatting:
                 'number_of_holdings': 0
             }
     
+    def _create_single_holding_analysis(self, holdings: List[Dict],
+                                        basic_metrics: Dict) -> Dict[str, Any]:
+        """Deterministic analysis for portfolios of zero or one holding"""
+        analysis = self._create_structured_fallback(basic_metrics, "")
+        analysis['parsing_note'] = (
+            "Computed directly from portfolio metrics (single-holding fast path)"
+        )
+
+        if holdings:
+            analysis['holdings_analysis'][0]['symbol'] = (
+                holdings[0].get('tradingsymbol', 'PRIMARY_HOLDING')
+            )
+
+        return {
+            'status': 'success',
+            'analysis': analysis,
+            'raw_analysis': 'single-holding fast path (no LLM call)',
+            'timestamp': self._get_timestamp(),
+            'fast_path': True
+        }
+
     def _create_fallback_response(self, basic_metrics: Dict, error_msg: str) -> Dict[str, Any]:
         """Create fallback response when analysis fails"""
         analysis = self._create_structured_fallback(basic_metrics, error_msg)
@@ -311,5 +479,4 @@ Return ONLY this JSON structure with no markdown formatting:
         }
     
     def _get_timestamp(self) -> str:
-        from datetime import datetime
         return datetime.now().isoformat()
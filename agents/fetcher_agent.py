@@ -1,38 +1,74 @@
 # agents/fetcher_agent.py
 import logging
+import random
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Dict, Any
+from config.settings import Config
 from kite_api.connector import kite_connector
+from kite_api.models import Holding
 import time
 
 logger = logging.getLogger(__name__)
 
 class PortfolioFetcherAgent:
     """Enhanced agent for fetching comprehensive portfolio data from Kite API"""
-    
+
     def __init__(self, name: str = "PortfolioFetcherAgent"):
         self.name = name
         self.connector = kite_connector
-    
+        self.ttl_seconds = Config.FETCH_CACHE_TTL
+        self._cache_lock = threading.Lock()
+        self._cached_result = None
+        self._cached_at = 0.0
+
     def execute(self) -> Dict[str, Any]:
         """Fetch comprehensive portfolio data with enhanced error handling"""
+        # Serve from the short-lived cache when the same portfolio is analyzed
+        # multiple times per session (chained agents, dashboard refresh)
+        with self._cache_lock:
+            if (self._cached_result is not None
+                    and time.monotonic() - self._cached_at < self.ttl_seconds):
+                logger.info(f"{self.name}: Returning cached portfolio data "
+                            f"(age < {self.ttl_seconds}s)")
+                return self._cached_result
+
         logger.info(f"{self.name}: Starting comprehensive portfolio data fetch...")
-        
+
         try:
-            # Fetch all required data with retry mechanism
-            data_sources = {
-                'profile': self._fetch_with_retry(self.connector.get_profile),
-                'holdings': self._fetch_with_retry(self.connector.get_holdings),
-                'positions': self._fetch_with_retry(self.connector.get_positions),
-                'margins': self._fetch_with_retry(self.connector.get_margins)
+            # Fetch all required data concurrently with retry mechanism
+            # The four calls are independent, so dispatch them to a thread pool
+            # and wait for all - latency becomes ~max(one call) instead of sum(four)
+            tasks = {
+                'profile': self.connector.get_profile,
+                'holdings': self.connector.get_holdings,
+                'positions': self.connector.get_positions,
+                'margins': self.connector.get_margins
             }
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = {
+                    key: executor.submit(self._fetch_with_retry, fetch_function)
+                    for key, fetch_function in tasks.items()
+                }
+                data_sources = {key: future.result() for key, future in futures.items()}
             
             # Validate critical data
             if not data_sources['holdings']:
                 logger.warning("No holdings data retrieved")
+
+            # Convert raw holding dicts to slotted records; the dict-style
+            # .get shim on Holding keeps downstream consumers unchanged
+            data_sources['holdings'] = [
+                Holding.from_dict(h) for h in data_sources['holdings'] or []
+            ]
             
             # Compile comprehensive portfolio data
             portfolio_data = {
                 **data_sources,
+                'holdings_soa': self._build_soa(data_sources['holdings']),
                 'timestamp': self._get_timestamp(),
                 'data_quality': self._assess_data_quality(data_sources),
                 'status': 'success'
@@ -41,7 +77,11 @@ class PortfolioFetcherAgent:
             logger.info(f"{self.name}: Successfully fetched portfolio data")
             logger.info(f"Holdings: {len(data_sources['holdings'])}, "
                        f"Net Positions: {len(data_sources['positions'].get('net', []))}")
-            
+
+            with self._cache_lock:
+                self._cached_result = portfolio_data
+                self._cached_at = time.monotonic()
+
             return portfolio_data
             
         except Exception as e:
@@ -52,18 +92,56 @@ class PortfolioFetcherAgent:
                 'timestamp': self._get_timestamp()
             }
     
+    def invalidate_cache(self):
+        """Drop cached data, e.g. after an order placed by another agent"""
+        with self._cache_lock:
+            self._cached_result = None
+            self._cached_at = 0.0
+
     def _fetch_with_retry(self, fetch_function, max_retries: int = 3) -> Any:
-        """Fetch data with retry mechanism"""
+        """Fetch data with exponential backoff and jitter between retries"""
         for attempt in range(max_retries):
             try:
                 return fetch_function()
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise e
-                logger.warning(f"Fetch attempt {attempt + 1} failed: {e}")
-                time.sleep(1)  # Wait before retry
+                # Fast first retry for transient blips, capped exponential
+                # growth after that; jitter avoids thundering-herd retries
+                # when the four parallel fetches fail together
+                delay = min(8.0, 0.25 * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                logger.warning(f"Fetch attempt {attempt + 1} failed: {e}, "
+                               f"retrying in {delay:.2f}s")
+                time.sleep(delay)
         return {}
     
+    def _build_soa(self, holdings) -> Dict[str, Any]:
+        """Convert the holdings list-of-dicts to columnar NumPy arrays.
+
+        Done once at the fetch boundary so every downstream consumer gets
+        contiguous arrays for vectorized analytics instead of re-walking
+        dicts per field. Prices and quantities fit comfortably in
+        float32/int32, which halves the bytes moved on the reduction paths;
+        consumers must accumulate in float64.
+        """
+        holdings = holdings or []
+        count = len(holdings)
+        return {
+            'symbol': np.array([h.symbol for h in holdings]),
+            'avg_price': np.fromiter(
+                (h.avg_price for h in holdings), dtype=np.float32, count=count
+            ),
+            'last_price': np.fromiter(
+                (h.last_price for h in holdings), dtype=np.float32, count=count
+            ),
+            'quantity': np.fromiter(
+                (h.qty for h in holdings), dtype=np.int32, count=count
+            ),
+            'pnl': np.fromiter(
+                (h.pnl for h in holdings), dtype=np.float32, count=count
+            )
+        }
+
     def _assess_data_quality(self, data_sources: Dict) -> Dict[str, str]:
         """Assess quality of fetched data"""
         quality = {}
@@ -88,5 +166,4 @@ class PortfolioFetcherAgent:
     
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
-        from datetime import datetime
         return datetime.now().isoformat()
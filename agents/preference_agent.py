@@ -1,39 +1,136 @@
 # agents/preference_agent.py
 import logging
-import json
-import os 
+import os
+import shutil
 from typing import Dict, Any, List, Optional
+from utils.json_utils import dumps_pretty, loads as json_loads
 from datetime import datetime
-from rich.console import Console
-from rich.prompt import Prompt, Confirm, IntPrompt, FloatPrompt
-from rich.table import Table
-from rich.panel import Panel
 
 logger = logging.getLogger(__name__)
-console = Console()
+
+# Rich costs hundreds of ms to import cold and is only needed for the
+# interactive flow - callers that just read saved preferences (e.g.
+# load_latest_preferences) should not pay for it. Populated on first use.
+console = None
+Prompt = Confirm = IntPrompt = FloatPrompt = Panel = None
+
+
+def _ensure_rich():
+    """Import Rich and create the console on first interactive use"""
+    global console, Prompt, Confirm, IntPrompt, FloatPrompt, Panel
+    if console is None:
+        from rich.console import Console
+        from rich import prompt, panel
+        console = Console()
+        Prompt = prompt.Prompt
+        Confirm = prompt.Confirm
+        IntPrompt = prompt.IntPrompt
+        FloatPrompt = prompt.FloatPrompt
+        Panel = panel.Panel
+
+# Static option groups - built once at import instead of on every execute();
+# the *_CHOICES tuples pre-compute the stringified keys Rich prompts need
+_EXPERIENCE_OPTIONS = {
+    1: "Beginner (0-2 years)",
+    2: "Intermediate (2-5 years)",
+    3: "Experienced (5-10 years)",
+    4: "Expert (10+ years)"
+}
+_EXPERIENCE_CHOICES = tuple(map(str, _EXPERIENCE_OPTIONS))
+
+_INCOME_RANGES = {
+    1: "Less than ₹5 lakhs",
+    2: "₹5-15 lakhs",
+    3: "₹15-30 lakhs",
+    4: "₹30-50 lakhs",
+    5: "More than ₹50 lakhs"
+}
+_INCOME_CHOICES = tuple(map(str, _INCOME_RANGES))
+
+_GOAL_OPTIONS = {
+    1: "Wealth Creation (Long-term growth)",
+    2: "Regular Income Generation",
+    3: "Capital Preservation",
+    4: "Tax Saving",
+    5: "Retirement Planning",
+    6: "Child's Education/Marriage",
+    7: "House Purchase",
+    8: "Other specific goal"
+}
+_GOAL_CHOICES = tuple(map(str, _GOAL_OPTIONS))
+
+_HORIZON_OPTIONS = {
+    1: "Short-term (< 2 years)",
+    2: "Medium-term (2-5 years)",
+    3: "Long-term (5-10 years)",
+    4: "Very long-term (> 10 years)"
+}
+_HORIZON_CHOICES = tuple(map(str, _HORIZON_OPTIONS))
+
+_RISK_OPTIONS = {
+    1: "Very Conservative (Capital protection is priority)",
+    2: "Conservative (Limited fluctuations acceptable)",
+    3: "Moderate (Balanced growth with reasonable risk)",
+    4: "Aggressive (High growth potential, higher volatility ok)",
+    5: "Very Aggressive (Maximum growth, comfortable with high risk)"
+}
+_RISK_CHOICES = tuple(map(str, _RISK_OPTIONS))
+
+_SECTORS = (
+    "Banking & Financial Services", "Information Technology", "Healthcare & Pharma",
+    "FMCG & Consumer", "Auto & Auto Components", "Energy & Power",
+    "Infrastructure & Real Estate", "Metals & Mining", "Chemicals"
+)
+
+_SECTORS_TO_AVOID = (
+    "Tobacco", "Alcohol", "Gambling", "Defense", "Pharmaceuticals", "None"
+)
+
+
+def _render_menu(heading: str, options: Dict[int, str]) -> str:
+    return "\n".join([heading] + [f"{key}. {value}" for key, value in options.items()])
+
+
+# Menus are static, so pre-render each block once at import; displaying a
+# menu becomes a single interned-string print
+_EXPERIENCE_MENU = _render_menu("\nInvestment Experience:", _EXPERIENCE_OPTIONS)
+_INCOME_MENU = _render_menu("\nAnnual Income Range:", _INCOME_RANGES)
+_GOAL_MENU = _render_menu("\nWhat is your primary investment goal?", _GOAL_OPTIONS)
+_HORIZON_MENU = _render_menu("\nInvestment Time Horizon:", _HORIZON_OPTIONS)
+_RISK_MENU = _render_menu("\nRisk Tolerance:", _RISK_OPTIONS)
 
 class UserPreferenceAgent:
     """Agent for collecting comprehensive user preferences and investment goals"""
-    
+
+    # Per-process cache for load_latest_preferences, keyed on the file's
+    # mtime so a re-saved profile is picked up automatically
+    _prefs_cache = None
+    _prefs_cache_mtime = 0.0
+
     def __init__(self, name: str = "UserPreferenceAgent"):
         self.name = name
         self.preferences = {}
     
     def execute(self) -> Dict[str, Any]:
         """Collect user preferences through interactive prompts"""
-        logger.info(f"{self.name}: Starting user preference collection...")
-        
+        logger.info("%s: Starting user preference collection...", self.name)
+        _ensure_rich()
+
         try:
+            # One clock read per session - reused for collection_date, the
+            # preferences timestamp and the save filename so they agree
+            now = datetime.now()
+
             # Display welcome message
             self._display_welcome()
-            
+
             # Collect preferences in sections
-            basic_info = self._collect_basic_info()
+            basic_info = self._collect_basic_info(collected_at=now.isoformat())
             investment_goals = self._collect_investment_goals()
             risk_preferences = self._collect_risk_preferences()
             portfolio_preferences = self._collect_portfolio_preferences()
             constraints = self._collect_constraints()
-            
+
             # Compile all preferences
             preferences = {
                 'basic_info': basic_info,
@@ -41,17 +138,17 @@ class UserPreferenceAgent:
                 'risk_preferences': risk_preferences,
                 'portfolio_preferences': portfolio_preferences,
                 'constraints': constraints,
-                'timestamp': self._get_timestamp(),
+                'timestamp': now.isoformat(),
                 'status': 'success'
             }
-            
+
             # Display summary
             self._display_preferences_summary(preferences)
-            
+
             # Confirm preferences
             if Confirm.ask("\n✅ Are these preferences correct?"):
-                self._save_preferences(preferences)
-                logger.info(f"{self.name}: User preferences collected successfully")
+                self._save_preferences(preferences, stamp=now.strftime("%Y%m%d_%H%M%S"))
+                logger.info("%s: User preferences collected successfully", self.name)
                 return preferences
             else:
                 console.print("❌ Preferences collection cancelled. Please run again to update.")
@@ -61,7 +158,7 @@ class UserPreferenceAgent:
             console.print("\n⏹️ Preference collection interrupted by user")
             return {'status': 'cancelled'}
         except Exception as e:
-            logger.error(f"{self.name}: Error collecting preferences: {e}")
+            logger.error("%s: Error collecting preferences: %s", self.name, e)
             return {
                 'status': 'error',
                 'error': str(e),
@@ -84,44 +181,27 @@ with your specific situation and objectives.
         
         console.print(Panel(welcome_text, title="Welcome", style="bold blue"))
     
-    def _collect_basic_info(self) -> Dict[str, Any]:
+    def _collect_basic_info(self, collected_at: str = None) -> Dict[str, Any]:
         """Collect basic investor information"""
         console.print("\n📋 Section 1: Basic Information", style="bold green")
         
         age = IntPrompt.ask("What is your age?", default=30)
-        
-        experience_options = {
-            1: "Beginner (0-2 years)",
-            2: "Intermediate (2-5 years)", 
-            3: "Experienced (5-10 years)",
-            4: "Expert (10+ years)"
-        }
-        
-        console.print("\nInvestment Experience:")
-        for key, value in experience_options.items():
-            console.print(f"{key}. {value}")
-        
-        experience = IntPrompt.ask("Select your experience level", choices=["1", "2", "3", "4"])
-        
-        income_ranges = {
-            1: "Less than ₹5 lakhs",
-            2: "₹5-15 lakhs",
-            3: "₹15-30 lakhs", 
-            4: "₹30-50 lakhs",
-            5: "More than ₹50 lakhs"
-        }
-        
-        console.print("\nAnnual Income Range:")
-        for key, value in income_ranges.items():
-            console.print(f"{key}. {value}")
-        
-        income_range = IntPrompt.ask("Select your income range", choices=["1", "2", "3", "4", "5"])
-        
+
+        # Each menu is one batched print of a pre-rendered constant - Rich
+        # makes a full rendering pass per call, so one string beats N lines
+        console.print(_EXPERIENCE_MENU)
+
+        experience = IntPrompt.ask("Select your experience level", choices=list(_EXPERIENCE_CHOICES))
+
+        console.print(_INCOME_MENU)
+
+        income_range = IntPrompt.ask("Select your income range", choices=list(_INCOME_CHOICES))
+
         return {
             'age': age,
-            'experience_level': experience_options[experience],
-            'income_range': income_ranges[income_range],
-            'collection_date': datetime.now().isoformat()
+            'experience_level': _EXPERIENCE_OPTIONS[experience],
+            'income_range': _INCOME_RANGES[income_range],
+            'collection_date': collected_at or datetime.now().isoformat()
         }
     
     def _collect_investment_goals(self) -> Dict[str, Any]:
@@ -129,42 +209,20 @@ with your specific situation and objectives.
         console.print("\n🎯 Section 2: Investment Goals & Objectives", style="bold green")
         
         # Primary goal
-        goal_options = {
-            1: "Wealth Creation (Long-term growth)",
-            2: "Regular Income Generation", 
-            3: "Capital Preservation",
-            4: "Tax Saving",
-            5: "Retirement Planning",
-            6: "Child's Education/Marriage",
-            7: "House Purchase",
-            8: "Other specific goal"
-        }
-        
-        console.print("\nWhat is your primary investment goal?")
-        for key, value in goal_options.items():
-            console.print(f"{key}. {value}")
-        
-        primary_goal = IntPrompt.ask("Select primary goal", choices=[str(i) for i in range(1, 9)])
-        
+        console.print(_GOAL_MENU)
+
+        primary_goal = IntPrompt.ask("Select primary goal", choices=list(_GOAL_CHOICES))
+
         if primary_goal == 8:
             other_goal = Prompt.ask("Please specify your goal")
             primary_goal_text = other_goal
         else:
-            primary_goal_text = goal_options[primary_goal]
-        
+            primary_goal_text = _GOAL_OPTIONS[primary_goal]
+
         # Investment horizon
-        horizon_options = {
-            1: "Short-term (< 2 years)",
-            2: "Medium-term (2-5 years)",
-            3: "Long-term (5-10 years)", 
-            4: "Very long-term (> 10 years)"
-        }
-        
-        console.print("\nInvestment Time Horizon:")
-        for key, value in horizon_options.items():
-            console.print(f"{key}. {value}")
-        
-        horizon = IntPrompt.ask("Select your time horizon", choices=["1", "2", "3", "4"])
+        console.print(_HORIZON_MENU)
+
+        horizon = IntPrompt.ask("Select your time horizon", choices=list(_HORIZON_CHOICES))
         
         # Expected returns
         expected_return = FloatPrompt.ask(
@@ -192,19 +250,9 @@ with your specific situation and objectives.
         console.print("\n⚖️ Section 3: Risk Preferences", style="bold green")
         
         # Risk tolerance
-        risk_options = {
-            1: "Very Conservative (Capital protection is priority)",
-            2: "Conservative (Limited fluctuations acceptable)",
-            3: "Moderate (Balanced growth with reasonable risk)",
-            4: "Aggressive (High growth potential, higher volatility ok)",
-            5: "Very Aggressive (Maximum growth, comfortable with high risk)"
-        }
-        
-        console.print("\nRisk Tolerance:")
-        for key, value in risk_options.items():
-            console.print(f"{key}. {value}")
-        
-        risk_tolerance = IntPrompt.ask("Select your risk tolerance", choices=["1", "2", "3", "4", "5"])
+        console.print(_RISK_MENU)
+
+        risk_tolerance = IntPrompt.ask("Select your risk tolerance", choices=list(_RISK_CHOICES))
         
         # Maximum drawdown tolerance
         max_drawdown = FloatPrompt.ask(
@@ -216,7 +264,7 @@ with your specific situation and objectives.
         volatility_comfort = Confirm.ask("Are you comfortable with daily portfolio fluctuations of 2-5%?")
         
         return {
-            'risk_tolerance': risk_options[risk_tolerance],
+            'risk_tolerance': _RISK_OPTIONS[risk_tolerance],
             'max_acceptable_drawdown': max_drawdown,
             'volatility_comfort': volatility_comfort,
             'risk_score': risk_tolerance  # 1-5 scale
@@ -235,14 +283,8 @@ with your specific situation and objectives.
         # Sector preferences
         console.print("\nDo you have any sector preferences?")
         sector_preferences = []
-        
-        sectors = [
-            "Banking & Financial Services", "Information Technology", "Healthcare & Pharma",
-            "FMCG & Consumer", "Auto & Auto Components", "Energy & Power", 
-            "Infrastructure & Real Estate", "Metals & Mining", "Chemicals"
-        ]
-        
-        for sector in sectors:
+
+        for sector in _SECTORS:
             preference = Confirm.ask(f"Interested in {sector}?", default=False)
             if preference:
                 sector_preferences.append(sector)
@@ -297,12 +339,8 @@ with your specific situation and objectives.
         # Sector restrictions
         avoid_sectors = []
         console.print("\nAny sectors you want to avoid?")
-        
-        sectors_to_avoid = [
-            "Tobacco", "Alcohol", "Gambling", "Defense", "Pharmaceuticals", "None"
-        ]
-        
-        for sector in sectors_to_avoid:
+
+        for sector in _SECTORS_TO_AVOID:
             if sector == "None":
                 if not avoid_sectors:
                     console.print("No sector restrictions selected.")
@@ -330,71 +368,84 @@ with your specific situation and objectives.
     def _display_preferences_summary(self, preferences: Dict[str, Any]):
         """Display a summary of collected preferences"""
         console.print("\n📋 Preferences Summary", style="bold blue")
-        
-        # Basic Info
+
         basic = preferences['basic_info']
-        console.print(f"\n👤 **Basic Info:**")
-        console.print(f"   Age: {basic['age']} | Experience: {basic['experience_level']}")
-        console.print(f"   Income: {basic['income_range']}")
-        
-        # Goals
         goals = preferences['investment_goals']
-        console.print(f"\n🎯 **Investment Goals:**")
-        console.print(f"   Primary Goal: {goals['primary_goal']}")
-        console.print(f"   Time Horizon: {goals['time_horizon']}")
-        console.print(f"   Expected Return: {goals['expected_return']}%")
-        console.print(f"   Monthly Addition: ₹{goals['monthly_addition']:,}")
-        
-        # Risk
         risk = preferences['risk_preferences']
-        console.print(f"\n⚖️ **Risk Profile:**")
-        console.print(f"   Risk Tolerance: {risk['risk_tolerance']}")
-        console.print(f"   Max Drawdown: {risk['max_acceptable_drawdown']}%")
-        
-        # Portfolio
         portfolio = preferences['portfolio_preferences']
-        console.print(f"\n💼 **Portfolio Preferences:**")
-        console.print(f"   Equity Allocation: {portfolio['preferred_equity_allocation']}%")
-        console.print(f"   Preferred Sectors: {', '.join(portfolio['preferred_sectors']) if portfolio['preferred_sectors'] else 'No specific preference'}")
-        console.print(f"   Number of Holdings: {portfolio['diversification_preference']}")
-        
-        # Constraints
         constraints = preferences['constraints']
-        console.print(f"\n🚫 **Constraints:**")
-        console.print(f"   Additional Budget: ₹{constraints['additional_investment_budget']:,}")
-        console.print(f"   Existing Portfolio: {constraints['existing_portfolio_action'].title()}")
-        console.print(f"   Avoid Sectors: {', '.join(constraints['avoid_sectors']) if constraints['avoid_sectors'] else 'None'}")
+
+        # Build the whole summary once and print it in a single pass
+        summary_lines = [
+            "\n👤 **Basic Info:**",
+            f"   Age: {basic['age']} | Experience: {basic['experience_level']}",
+            f"   Income: {basic['income_range']}",
+            "\n🎯 **Investment Goals:**",
+            f"   Primary Goal: {goals['primary_goal']}",
+            f"   Time Horizon: {goals['time_horizon']}",
+            f"   Expected Return: {goals['expected_return']}%",
+            f"   Monthly Addition: ₹{goals['monthly_addition']:,}",
+            "\n⚖️ **Risk Profile:**",
+            f"   Risk Tolerance: {risk['risk_tolerance']}",
+            f"   Max Drawdown: {risk['max_acceptable_drawdown']}%",
+            "\n💼 **Portfolio Preferences:**",
+            f"   Equity Allocation: {portfolio['preferred_equity_allocation']}%",
+            f"   Preferred Sectors: {', '.join(portfolio['preferred_sectors']) if portfolio['preferred_sectors'] else 'No specific preference'}",
+            f"   Number of Holdings: {portfolio['diversification_preference']}",
+            "\n🚫 **Constraints:**",
+            f"   Additional Budget: ₹{constraints['additional_investment_budget']:,}",
+            f"   Existing Portfolio: {constraints['existing_portfolio_action'].title()}",
+            f"   Avoid Sectors: {', '.join(constraints['avoid_sectors']) if constraints['avoid_sectors'] else 'None'}",
+        ]
+        console.print("\n".join(summary_lines))
     
-    def _save_preferences(self, preferences: Dict[str, Any]):
+    def _save_preferences(self, preferences: Dict[str, Any], stamp: str = None):
         """Save preferences to file"""
         preferences_dir = "user_preferences"
         os.makedirs(preferences_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        timestamp = stamp or datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"user_preferences_{timestamp}.json"
         filepath = os.path.join(preferences_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(preferences, f, indent=2, default=str)
-        
-        # Also save as latest preferences
+
+        # Serialize once, write the timestamped file, then copy the bytes
+        # into latest - no second JSON encoding pass
+        payload = dumps_pretty(preferences)
+        with open(filepath, 'wb') as f:
+            f.write(payload)
+
         latest_filepath = os.path.join(preferences_dir, "latest_preferences.json")
-        with open(latest_filepath, 'w', encoding='utf-8') as f:
-            json.dump(preferences, f, indent=2, default=str)
-        
+        shutil.copyfile(filepath, latest_filepath)
+
         console.print(f"✅ Preferences saved to: {filename}")
     
     def _get_timestamp(self) -> str:
         return datetime.now().isoformat()
 
-    @staticmethod
-    def load_latest_preferences() -> Optional[Dict[str, Any]]:
-        """Load the latest saved preferences"""
+    @classmethod
+    def load_latest_preferences(cls) -> Optional[Dict[str, Any]]:
+        """Load the latest saved preferences.
+
+        The parsed dict is cached for the process and revalidated with a
+        single stat per call; the file is only re-read and re-parsed when
+        its mtime changes (i.e. after a new collection run saved it).
+        """
+        filepath = os.path.join("user_preferences", "latest_preferences.json")
         try:
-            filepath = os.path.join("user_preferences", "latest_preferences.json")
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            mtime = os.stat(filepath).st_mtime
+        except OSError:
+            return None
+
+        if cls._prefs_cache is not None and mtime == cls._prefs_cache_mtime:
+            return cls._prefs_cache
+
+        try:
+            with open(filepath, 'rb') as f:
+                prefs = json_loads(f.read())
         except Exception as e:
-            logger.warning(f"Could not load latest preferences: {e}")
-        return None
+            logger.warning("Could not load latest preferences: %s", e)
+            return None
+
+        cls._prefs_cache = prefs
+        cls._prefs_cache_mtime = mtime
+        return prefs
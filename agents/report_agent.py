@@ -1,105 +1,39 @@
 # agents/report_agent.py
+import functools
+import hashlib
 import logging
 import os
+import shutil
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import count, islice
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
+from utils.json_utils import dumps as json_dumps
 
 logger = logging.getLogger(__name__)
 
-class ReportGeneratorAgent:
-    """Enhanced agent for generating comprehensive portfolio reports with dynamic user preferences"""
-    
-    def __init__(self, name: str = "ReportGeneratorAgent"):
-        self.name = name
-        self.reports_dir = "reports"
-        os.makedirs(self.reports_dir, exist_ok=True)
-    
-    def execute(self, analysis_data: Dict[str, Any], suggestions_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate comprehensive portfolio report with dynamic user preferences"""
-        logger.info(f"{self.name}: Generating comprehensive portfolio report...")
-        
-        try:
-            # Generate comprehensive report content
-            report_content = self._generate_comprehensive_report_content(analysis_data, suggestions_data)
-            
-            # Save report to file
-            filename = self._save_report(report_content)
-            
-            # Generate executive summary
-            exec_summary = self._generate_executive_summary(analysis_data, suggestions_data)
-            
-            logger.info(f"{self.name}: Comprehensive report generated successfully: {filename}")
-            
-            return {
-                'status': 'success',
-                'filename': filename,
-                'content': report_content,
-                'executive_summary': exec_summary,
-                'timestamp': self._get_timestamp()
-            }
-            
-        except Exception as e:
-            logger.error(f"{self.name}: Report generation error: {e}")
-            return {
-                'status': 'error',
-                'error': str(e),
-                'timestamp': self._get_timestamp()
-            }
-    
-    def _generate_comprehensive_report_content(self, analysis_data: Dict, suggestions_data: Dict) -> str:
-        """Generate comprehensive formatted report content with dynamic user preferences"""
-        timestamp = datetime.now().strftime("%B %d, %Y at %I:%M %p")
-        
-        # Extract data with proper defaults
-        analysis = analysis_data.get('analysis', {})
-        suggestions = suggestions_data.get('suggestions', {})
-        
-        # EXTRACT USER PREFERENCES DYNAMICALLY from suggestions data
-        user_preferences = suggestions.get('user_preferences_applied', {})
-        
-        # Get user-specific values from preferences - NO HARDCODING
-        basic_info = user_preferences.get('basic_info', {})
-        goals = user_preferences.get('investment_goals', {})
-        risk_prefs = user_preferences.get('risk_preferences', {})
-        portfolio_prefs = user_preferences.get('portfolio_preferences', {})
-        constraints = user_preferences.get('constraints', {})
-        
-        # DYNAMIC VALUES - NOT HARDCODED - Safe conversion to ensure numeric values
-        additional_budget = self._safe_int(constraints.get('additional_investment_budget', 0))
-        monthly_liquidity = self._safe_int(constraints.get('liquidity_amount', 0))
-        liquidity_frequency = str(constraints.get('liquidity_frequency', 'N/A'))
-        liquidity_needs = bool(constraints.get('liquidity_needs', False))
-        preferred_sectors = list(portfolio_prefs.get('preferred_sectors', []))
-        risk_tolerance = str(risk_prefs.get('risk_tolerance', 'Not specified'))
-        primary_goal = str(goals.get('primary_goal', 'Not specified'))
-        time_horizon = str(goals.get('time_horizon', 'Not specified'))
-        expected_return = self._safe_float(goals.get('expected_return', 0))
-        monthly_addition = self._safe_int(goals.get('monthly_addition', 0))
-        target_corpus = self._safe_int(goals.get('target_corpus', 0))
-        user_age = self._safe_str(basic_info.get('age', 'N/A'))
-        experience_level = str(basic_info.get('experience_level', 'N/A'))
-        equity_preference = self._safe_int(portfolio_prefs.get('preferred_equity_allocation', 70))
-        risk_score = self._safe_int(risk_prefs.get('risk_score', 3))
-        existing_action = str(constraints.get('existing_portfolio_action', 'modify'))
-        
-        # Extract analysis data
-        exec_summary = analysis.get('executive_summary', {})
-        holdings_analysis = analysis.get('holdings_analysis', [])
-        sector_analysis = analysis.get('sector_analysis', {})
-        key_insights = analysis.get('key_insights', [])
-        risk_warnings = analysis.get('risk_warnings', [])
-        opportunities = analysis.get('opportunities', [])
-        
-        # Extract suggestions data
-        personalized_analysis = suggestions.get('personalized_analysis', {})
-        existing_portfolio_action = suggestions.get('existing_portfolio_action', {})
-        new_investments = suggestions.get('new_investments', [])
-        implementation_strategy = suggestions.get('implementation_strategy', {})
-        risk_management = suggestions.get('risk_management', {})
-        goal_alignment = suggestions.get('goal_alignment', {})
-        
-        # Build report with DYNAMIC values - using safe formatting
-        report = f"""# Comprehensive Personalized Portfolio Analysis Report
+# Above this many holdings, numeric coercion for the holdings table goes
+# through a NumPy structured array instead of per-row Python casts
+_VECTORIZE_THRESHOLD = 64
+
+# Snapshot-table status cells, indexed by the boolean condition so the
+# header renders with index lookups instead of paired ternaries
+_PNL_STYLE = (('🟢', 'Profit'), ('🔴', 'Loss'))          # [total_pnl < 0]
+_DIVERSIFICATION_STYLE = ('✅ Well-diversified', '⚠️ Under-diversified')  # [count < 5]
+
+# Scaling ceiling for the sector-allocation table; the analyzer normally
+# emits a handful of rows, but a degenerate payload shouldn't blow up
+# the report
+_MAX_SECTOR_ROWS = 25
+
+# Report section templates - the markdown skeleton is static, so each block
+# is declared once at module level and rendered with str.format; the method
+# below only computes the context values and stitches sections together
+
+_REPORT_HEADER_TMPL = """# Comprehensive Personalized Portfolio Analysis Report
 
 *Generated on {timestamp}*
 
@@ -123,20 +57,18 @@ class ReportGeneratorAgent:
 
 **Liquidity Requirements:**"""
 
-        if liquidity_needs and monthly_liquidity > 0:
-            report += f"""
-- **Liquidity Needed:** ₹{monthly_liquidity:,} {liquidity_frequency.lower()}
+_LIQUIDITY_NEEDS_TMPL = """
+- **Liquidity Needed:** ₹{monthly_liquidity:,} {liquidity_frequency}
 - **Liquidity Strategy Required:** Yes"""
-        else:
-            report += f"""
+
+_NO_LIQUIDITY_BLOCK = """
 - **Regular Liquidity Needed:** No"""
 
-        preferred_sectors_str = ', '.join(preferred_sectors) if preferred_sectors else 'No specific sector preferences'
-        report += f"""
+_PORTFOLIO_ANALYSIS_TMPL = """
 
 **Sector Preferences:** {preferred_sectors_str}
 
-**Existing Portfolio Preference:** {existing_action.title()}
+**Existing Portfolio Preference:** {existing_action_title}
 
 ---
 
@@ -145,88 +77,48 @@ class ReportGeneratorAgent:
 ### Portfolio Snapshot
 | Metric | Value | Status |
 |--------|--------|---------|
-| **Total Investment** | ₹{self._safe_float(exec_summary.get('total_investment', 0)):,.2f} | - |
-| **Current Value** | ₹{self._safe_float(exec_summary.get('current_value', 0)):,.2f} | {'🔴' if self._safe_float(exec_summary.get('total_pnl', 0)) < 0 else '🟢'} |
-| **Total P&L** | ₹{self._safe_float(exec_summary.get('total_pnl', 0)):,.2f} ({self._safe_float(exec_summary.get('total_pnl_percentage', 0)):+.2f}%) | {'Loss' if self._safe_float(exec_summary.get('total_pnl', 0)) < 0 else 'Profit'} |
-| **Holdings Count** | {self._safe_int(exec_summary.get('number_of_holdings', 0))} | {'⚠️ Under-diversified' if self._safe_int(exec_summary.get('number_of_holdings', 0)) < 5 else '✅ Well-diversified'} |
+| **Total Investment** | ₹{total_investment:,.2f} | - |
+| **Current Value** | ₹{current_value:,.2f} | {value_icon} |
+| **Total P&L** | ₹{total_pnl:,.2f} ({total_pnl_pct:+.2f}%) | {pnl_word} |
+| **Holdings Count** | {holdings_count} | {diversification_status} |
 
 ### Goal Alignment Analysis
-- **Current vs Target:** ₹{self._safe_float(exec_summary.get('current_value', 0)):,.2f} / ₹{target_corpus:,} target
-- **Gap to Target:** ₹{max(0, target_corpus - self._safe_float(exec_summary.get('current_value', 0))):,}
-- **Time to Goal:** {self._calculate_time_to_goal(target_corpus, exec_summary.get('current_value', 0), monthly_addition, additional_budget):.1f} years (with current plan)
+- **Current vs Target:** ₹{current_value:,.2f} / ₹{target_corpus:,} target
+- **Gap to Target:** ₹{gap_to_target:,}
+- **Time to Goal:** {time_to_goal:.1f} years (with current plan)
 
 ---
 
 ## 🏢 Holdings Analysis
 
 """
-        
-        # Add holdings analysis with safety check
-        if holdings_analysis and isinstance(holdings_analysis, list):
-            for i, holding in enumerate(holdings_analysis, 1):
-                symbol = str(holding.get('symbol', f'Holding {i}'))
-                sector = str(holding.get('sector', 'N/A'))
-                pnl = self._safe_float(holding.get('pnl', 0))
-                pnl_pct = self._safe_float(holding.get('pnl_percentage', 0))
-                weight = self._safe_float(holding.get('weight_in_portfolio', 0))
-                
-                report += f"""### {i}. {symbol}
+
+_HOLDING_ENTRY_TMPL = """### {index}. {symbol}
 **Sector:** {sector} | **P&L:** ₹{pnl:,.0f} ({pnl_pct:+.2f}%)
-**Portfolio Weight:** {weight:.1f}% | **Recommendation:** {holding.get('recommendation', 'Review')}
+**Portfolio Weight:** {weight:.1f}% | **Recommendation:** {recommendation}
 
 """
-        else:
-            report += "Current portfolio shows high concentration - detailed analysis needed.\n\n"
 
-        # Sector Analysis
-        sector_allocation = sector_analysis.get('sector_allocation', [])
-        report += f"""---
+_SECTOR_SECTION_HEADER = """---
 
 ## 🏭 Sector Analysis vs Your Preferences
 
 ### Current Allocation
 """
-        
-        if sector_allocation and isinstance(sector_allocation, list):
-            for sector in sector_allocation:
-                sector_name = str(sector.get('sector', 'N/A'))
-                sector_pct = self._safe_float(sector.get('percentage', 0))
-                sector_value = self._safe_float(sector.get('value', 0))
-                
-                # Check if this sector is in user preferences
-                preference_match = "✅ Preferred" if any(pref.lower() in sector_name.lower() for pref in preferred_sectors) else "⚪ Not in preferences"
-                
-                report += f"**{sector_name}:** {sector_pct:.1f}% (₹{sector_value:,.0f}) - {preference_match}\n"
-        else:
-            report += "**Current:** 100% concentrated in single unknown sector\n"
 
-        if preferred_sectors:
-            missing_sectors = [sector for sector in preferred_sectors if not any(alloc.get('sector', '').lower() == sector.lower() for alloc in sector_allocation)]
-            if missing_sectors:
-                report += f"""
+_MISSING_SECTORS_TMPL = """
 ### Missing Sectors from Your Preferences
-Sectors you're interested in but not currently invested: {', '.join(missing_sectors)}
+Sectors you're interested in but not currently invested: {missing_sectors_str}
 """
 
-        # Key Insights
-        report += f"""
+_INSIGHTS_HEADER = """
 ---
 
 ## 🔍 Key Insights Based on Your Profile
 
 """
-        
-        if key_insights and isinstance(key_insights, list):
-            for i, insight in enumerate(key_insights[:5], 1):
-                report += f"{i}. {insight}\n"
-        else:
-            # Generate insights based on user profile
-            report += f"1. As a {user_age}-year-old {experience_level.lower()} investor, your portfolio needs diversification\n"
-            report += f"2. Your {primary_goal.lower()} goal requires strategic sector allocation\n"
-            report += f"3. With {risk_tolerance.lower()} risk tolerance, current concentration is concerning\n"
 
-        # Personalized Recommendations Section
-        report += f"""
+_RECOMMENDATIONS_HEADER = """
 ---
 
 ## 🎯 Personalized Strategic Recommendations
@@ -234,28 +126,15 @@ Sectors you're interested in but not currently invested: {', '.join(missing_sect
 ### Portfolio Assessment Based on Your Profile
 
 """
-        
-        if personalized_analysis:
-            alignment = str(personalized_analysis.get('alignment_with_goals', f'Portfolio needs restructuring to align with {primary_goal}'))
-            risk_assess = str(personalized_analysis.get('risk_assessment', f'Risk level needs adjustment for {risk_tolerance}'))
-            gap_analysis = str(personalized_analysis.get('gap_analysis', f'Missing exposure to preferred sectors: {", ".join(preferred_sectors[:3])}'))
-            
-            report += f"""**Goal Alignment:** {alignment}
+
+_ASSESSMENT_TMPL = """**Goal Alignment:** {alignment}
 
 **Risk Assessment:** {risk_assess}
 
 **Gap Analysis:** {gap_analysis}
-"""
-        else:
-            report += f"""**Goal Alignment:** Your {primary_goal} goal requires strategic changes to current portfolio structure
-
-**Risk Assessment:** Current portfolio risk doesn't match your {risk_tolerance} profile
-
-**Gap Analysis:** Missing diversification across your preferred sectors: {', '.join(preferred_sectors[:3]) if preferred_sectors else 'multiple sectors'}
 """
 
-        # Investment Recommendations based on Budget
-        report += f"""
+_INVESTMENT_STRATEGY_TMPL = """
 ---
 
 ## 💰 Personalized Investment Strategy
@@ -263,142 +142,819 @@ Sectors you're interested in but not currently invested: {', '.join(missing_sect
 ### Your Investment Capacity
 - **Additional Budget Available:** ₹{additional_budget:,}
 - **Monthly SIP Capacity:** ₹{monthly_addition:,}
-- **Total Annual Capacity:** ₹{additional_budget + (monthly_addition * 12):,}
+- **Total Annual Capacity:** ₹{annual_capacity:,}
 
 """
 
-        if additional_budget > 0 or monthly_addition > 0:
-            report += f"""### Recommended Investment Allocation
+_ALLOCATION_HEADER_TMPL = """### Recommended Investment Allocation
 
 Based on your preferred sectors: {preferred_sectors_str}
 
 """
-            
-            if new_investments and isinstance(new_investments, list):
-                for investment in new_investments[:5]:  # Limit to top 5
-                    symbol = str(investment.get('symbol', 'N/A'))
-                    sector = str(investment.get('sector', 'N/A'))
-                    allocation_amt = self._safe_int(investment.get('allocation_amount', 0))
-                    allocation_pct = self._safe_float(investment.get('allocation_percentage', 0))
-                    priority = str(investment.get('priority', 'Medium'))
-                    timeline = str(investment.get('timeline', 'Immediate'))
-                    rationale = str(investment.get('rationale', 'Aligns with your sector preferences'))
-                    
-                    # Check if sector matches user preference
-                    sector_match = "✅ Matches your preference" if any(pref.lower() in sector.lower() for pref in preferred_sectors) else "🔍 Strategic addition"
-                    
-                    report += f"""**{symbol} - {sector} Sector** {sector_match}
+
+_INVESTMENT_ENTRY_TMPL = """**{symbol} - {sector} Sector** {sector_match}
 - **Suggested Investment:** ₹{allocation_amt:,} ({allocation_pct:.1f}% of total portfolio)
 - **Priority:** {priority} | **Timeline:** {timeline}
 - **Why this fits you:** {rationale}
 
 """
-            else:
-                # Generate fallback recommendations based on user preferences
-                if preferred_sectors:
-                    budget_per_sector = additional_budget // max(len(preferred_sectors[:4]), 1)  # Top 4 preferred sectors
-                    
-                    sector_stocks = {
-                        'Banking & Financial Services': ('HDFCBANK', 'Leading private bank with consistent dividends'),
-                        'Information Technology': ('HCLTECH', 'Stable IT services with global presence'),
-                        'Auto & Auto Components': ('MARUTI', 'Market leader in passenger vehicles'),
-                        'Energy & Power': ('RELIANCE', 'Diversified energy conglomerate'),
-                        'Infrastructure & Real Estate': ('L&T', 'Leading infrastructure company')
-                    }
-                    
-                    for sector in preferred_sectors[:4]:
-                        if sector in sector_stocks:
-                            stock, description = sector_stocks[sector]
-                            report += f"""**{stock} - {sector}** ✅ Your Preferred Sector
+
+_FALLBACK_STOCK_TMPL = """**{stock} - {sector}** ✅ Your Preferred Sector
 - **Suggested Investment:** ₹{budget_per_sector:,}
 - **Priority:** High | **Timeline:** Immediate
 - **Why this fits you:** {description} - aligns with your {sector} sector preference
 
 """
 
-        # Liquidity Management Strategy
-        if liquidity_needs and monthly_liquidity > 0:
-            current_value = self._safe_float(exec_summary.get('current_value', 0))
-            total_portfolio = max(current_value + additional_budget, 1)
-            liquidity_percentage = (monthly_liquidity * 12) / total_portfolio * 100
-            
-            report += f"""
+_LIQUIDITY_STRATEGY_TMPL = """
 ### Liquidity Management Strategy
 
-**Your Requirement:** ₹{monthly_liquidity:,} {liquidity_frequency.lower()}
-**Annual Liquidity Need:** ₹{self._calculate_annual_liquidity(monthly_liquidity, liquidity_frequency):,}
+**Your Requirement:** ₹{monthly_liquidity:,} {liquidity_frequency}
+**Annual Liquidity Need:** ₹{annual_liquidity:,}
 **Portfolio Allocation for Liquidity:** {liquidity_percentage:.1f}%
 
 **Strategy:**
-- Maintain {min(25, liquidity_percentage + 5):.0f}% in dividend-paying stocks from your preferred sectors
-- Keep {max(10, liquidity_percentage):.0f}% in liquid instruments for immediate needs
+- Maintain {dividend_pct:.0f}% in dividend-paying stocks from your preferred sectors
+- Keep {liquid_pct:.0f}% in liquid instruments for immediate needs
 - Focus on quarterly dividend-paying stocks in Banking and FMCG sectors
 """
 
-        # Calculate next review date
-        next_review = datetime.now() + timedelta(days=30)
-        
-        # Conclusion
-        report += f"""
+_CONCLUSION_TMPL = """
 ---
 
 ## 📋 Personalized Action Summary
 
 ### Your Investment Profile Summary
-- **Age & Experience:** {user_age} years, {experience_level.lower()}
-- **Goal & Timeline:** {primary_goal} over {time_horizon.lower()}
+- **Age & Experience:** {user_age} years, {experience_lower}
+- **Goal & Timeline:** {primary_goal} over {time_horizon_lower}
 - **Risk & Return:** {risk_tolerance} with {expected_return:.1f}% target return
 - **Budget & SIP:** ₹{additional_budget:,} immediate + ₹{monthly_addition:,} monthly
-- **Sector Focus:** {', '.join(preferred_sectors[:3]) if preferred_sectors else 'Diversified approach'}
+- **Sector Focus:** {sector_focus}
 
 ### Immediate Next Steps (Based on Your Preferences)
-1. **Deploy ₹{additional_budget:,}** across {len(preferred_sectors) if preferred_sectors else 3} sectors immediately
+1. **Deploy ₹{additional_budget:,}** across {sector_count} sectors immediately
 2. **Set up ₹{monthly_addition:,} monthly SIP** for systematic growth
-3. **Establish {f'₹{monthly_liquidity:,} {liquidity_frequency.lower()} withdrawal' if liquidity_needs else 'quarterly review'} system**
-4. **Implement {10 if risk_score <= 2 else 15}% stop-loss** appropriate for your risk tolerance
+3. **Establish {liquidity_step} system**
+4. **Implement {stop_loss_pct}% stop-loss** appropriate for your risk tolerance
 
 ### Success Metrics Tailored to You
-- Achieve ₹{target_corpus:,} target in {self._calculate_time_to_goal(target_corpus, exec_summary.get('current_value', 0), monthly_addition, additional_budget):.1f} years
-- Maintain {expected_return:.1f}% annual returns aligned with {risk_tolerance.lower()} profile
-- Generate {'₹{:,} {} income'.format(monthly_liquidity, liquidity_frequency.lower()) if liquidity_needs else 'consistent growth'}
+- Achieve ₹{target_corpus:,} target in {time_to_goal:.1f} years
+- Maintain {expected_return:.1f}% annual returns aligned with {risk_lower} profile
+- Generate {income_metric}
 - Build diversified portfolio across your preferred sectors
 
 ---
 
-*This analysis is specifically tailored for a {user_age}-year-old {experience_level.lower()} investor with {primary_goal.lower()} goal, ₹{additional_budget:,} immediate budget, ₹{monthly_addition:,} monthly SIP capacity, and preferences for {', '.join(preferred_sectors[:3]) if preferred_sectors else 'diversified investing'}.*
+*This analysis is specifically tailored for a {user_age}-year-old {experience_lower} investor with {primary_goal_lower} goal, ₹{additional_budget:,} immediate budget, ₹{monthly_addition:,} monthly SIP capacity, and preferences for {sector_focus_footer}.*
 
-**Generated on:** {timestamp}  
-**Next Review Date:** {next_review.strftime('%B %d, %Y')}
+**Generated on:** {timestamp}
+**Next Review Date:** {next_review}
 
 ---
 
 ### Important Notes
-- All recommendations are based on your preferences collected on {basic_info.get('collection_date', timestamp)[:10]}
+- All recommendations are based on your preferences collected on {collection_date}
 - Market conditions can change - maintain flexibility within your risk tolerance
 - Consider consulting a financial advisor for complex tax and legal matters
 - This system will learn and improve recommendations based on your feedback
 """
+
+# Minimal report emitted when the analyzer failed upstream; skips the
+# full scaffolding so error-path latency stays negligible
+_ERROR_REPORT_TMPL = """# Portfolio Analysis Report
+
+*Generated on {timestamp}*
+
+---
+
+## ⚠️ Analysis Unavailable
+
+The portfolio analysis could not be completed, so no personalized
+report was generated.
+
+**Reason:** {reason}
+
+Please re-run the analysis once the underlying issue is resolved.
+"""
+
+_EXEC_SUMMARY_TMPL = """
+PERSONALIZED PORTFOLIO EXECUTIVE SUMMARY
+=======================================
+
+INVESTOR PROFILE: {user_age}-year-old pursuing {primary_goal}
+
+CURRENT PORTFOLIO:
+Total Investment: ₹{total_investment:,.2f}
+Current Value: ₹{current_value:,.2f}
+P&L: ₹{total_pnl:,.2f} ({total_pnl_pct:+.2f}%)
+
+INVESTMENT CAPACITY:
+Additional Budget: ₹{additional_budget:,}
+Monthly SIP: ₹{monthly_addition:,}
+Total Annual Capacity: ₹{annual_capacity:,}
+
+PERSONALIZED IMMEDIATE ACTIONS:
+"""
+
+# Fallback picks per preferred sector, used when the suggestion engine
+# returned no concrete investments; static, so built once at import
+_SECTOR_STOCKS = {
+    'Banking & Financial Services': ('HDFCBANK', 'Leading private bank with consistent dividends'),
+    'Information Technology': ('HCLTECH', 'Stable IT services with global presence'),
+    'Auto & Auto Components': ('MARUTI', 'Market leader in passenger vehicles'),
+    'Energy & Power': ('RELIANCE', 'Diversified energy conglomerate'),
+    'Infrastructure & Real Estate': ('L&T', 'Leading infrastructure company')
+}
+
+@dataclass(slots=True, frozen=True)
+class _UserContext:
+    """User preference values extracted once per execute() call.
+
+    Both the full report and the executive summary unpack the same
+    preference dicts through the safe converters; building this record
+    once halves that traversal work.
+    """
+    user_age: str
+    experience_level: str
+    primary_goal: str
+    time_horizon: str
+    expected_return: float
+    monthly_addition: int
+    target_corpus: int
+    risk_tolerance: str
+    risk_score: int
+    equity_preference: int
+    preferred_sectors: tuple
+    additional_budget: int
+    monthly_liquidity: int
+    liquidity_frequency: str
+    liquidity_needs: bool
+    existing_action: str
+    collection_date: str
+
+
+# Pure goal/liquidity math, memoized: the time-to-goal figure is rendered
+# in two report sections per call with identical arguments
+@functools.lru_cache(maxsize=256)
+def _time_to_goal(target: int, current: float, monthly: int, additional: int) -> float:
+    """Years to reach the target corpus at the stated contribution rate"""
+    # Inputs arrive via the safe converters, so a guard on the divisor is
+    # all the validation needed - no exception handler on the common path
+    annual_capacity = monthly * 12 + additional
+    if annual_capacity <= 0:
+        return 10.0  # Default 10 years if no investment capacity
+    return max(0, target - current) / annual_capacity
+
+
+@functools.lru_cache(maxsize=256)
+def _annual_liquidity(monthly_liquidity: int, frequency: str) -> int:
+    """Annual liquidity requirement for a withdrawal frequency label"""
+    frequency_lower = frequency.lower()
+    if 'monthly' in frequency_lower:
+        return monthly_liquidity * 12
+    elif 'quarterly' in frequency_lower:
+        return monthly_liquidity * 4
+    elif 'half' in frequency_lower or 'semi' in frequency_lower:
+        return monthly_liquidity * 2
+    else:
+        return monthly_liquidity * 4  # Default quarterly
+
+
+# Serial for temp-file names: the second-resolution report filename can
+# repeat across back-to-back execute() calls, and the I/O pool may run
+# both writes at once - a pid-only suffix would point them at the same
+# temp file and interleave their bytes
+_tmp_serial = count()
+
+
+def _write_chunks(filepath: str, chunks):
+    """Stream report chunks to disk, encoding each as it goes (I/O pool).
+
+    Writes to a uniquely named sibling temp file and publishes with
+    os.replace, so a crash mid-write never leaves a truncated report
+    under the final name, concurrent writes to the same name cannot
+    interleave, and readers only ever see complete files.
+    """
+    tmp_path = f"{filepath}.tmp.{os.getpid()}.{next(_tmp_serial)}"
+    with open(tmp_path, 'wb', buffering=1 << 20) as f:
+        for chunk in chunks:
+            f.write(chunk.encode('utf-8'))
+    os.replace(tmp_path, filepath)
+
+
+def _log_write_failure(future):
+    """Done-callback for background writes: a failed write must never vanish.
+
+    The pending-writes prune drops completed futures without inspecting
+    them, so without this callback an exception raised on the I/O pool
+    would be swallowed silently after execute() already reported success.
+    """
+    exc = future.exception()
+    if exc is not None:
+        logger.error(f"Background report write failed: {exc}")
+
+
+def _as_list(value) -> list:
+    """Coerce a maybe-list once at extraction time.
+
+    The render loops can then test plain truthiness instead of repeating
+    isinstance guards at every use site.
+    """
+    if isinstance(value, list):
+        return value
+    if isinstance(value, tuple):
+        return list(value)
+    return []
+
+
+# The safe converters run dozens of times per report, mostly on the same
+# handful of values; memoizing skips the repeated str()/float() round-trips.
+# typed=True keeps equal-comparing keys of different types apart - with the
+# default, a cached _coerce_int(True) == 0 would be served for 1 and 1.0
+@functools.lru_cache(maxsize=2048, typed=True)
+def _coerce_int(value) -> int:
+    try:
+        if isinstance(value, str) and value.lower() in ['n/a', 'none', '']:
+            return 0
+        return int(float(str(value)) if value is not None else 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+@functools.lru_cache(maxsize=2048, typed=True)
+def _coerce_float(value) -> float:
+    try:
+        if isinstance(value, str) and value.lower() in ['n/a', 'none', '']:
+            return 0.0
+        return float(str(value)) if value is not None else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+class ReportGeneratorAgent:
+    """Enhanced agent for generating comprehensive portfolio reports with dynamic user preferences"""
+
+    reports_dir = "reports"
+    _dir_ready = False
+    _CACHE_SIZE = 32
+    # Shared pool for report writes; callers only need the filename, so the
+    # disk write proceeds in the background while execute() returns
+    _io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='report-io')
+
+    def __init__(self, name: str = "ReportGeneratorAgent"):
+        self.name = name
+        self._pending_writes = []
+        # Result cache keyed on a hash of the inputs - dashboards re-render
+        # the same analysis repeatedly, so repeat calls become lookups
+        self._result_cache = OrderedDict()
+
+    @classmethod
+    def _ensure_reports_dir(cls):
+        """Create the reports directory lazily, once per process.
+
+        Called from the write paths rather than __init__, so constructing
+        an agent (or serving purely from the in-memory cache) costs no
+        stat/mkdir syscalls.
+        """
+        if not cls._dir_ready:
+            os.makedirs(os.path.join(cls.reports_dir, '.cache'), exist_ok=True)
+            cls._dir_ready = True
+
+    def _disk_cache_path(self, digest: bytes) -> str:
+        """Path of the cached rendered markdown for an input digest"""
+        return os.path.join(self.reports_dir, '.cache', digest.hex() + '.md')
+
+    def _submit_write(self, fn, *args) -> None:
+        """Queue a background write on the I/O pool.
+
+        Completed futures are pruned here; each new future gets a
+        done-callback so a write that fails after pruning still logs its
+        exception, and flush() re-raises whatever is still pending.
+        """
+        self._pending_writes = [f for f in self._pending_writes if not f.done()]
+        future = self._io_pool.submit(fn, *args)
+        future.add_done_callback(_log_write_failure)
+        self._pending_writes.append(future)
+
+    def _publish_cached(self, cached_md: str, now: datetime = None) -> str:
+        """Copy a disk-cached report to a fresh dated filename"""
+        self._ensure_reports_dir()
+        timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
+        filename = f"personalized_portfolio_analysis_{timestamp}.md"
+        filepath = os.path.join(self.reports_dir, filename)
+        self._submit_write(shutil.copyfile, cached_md, filepath)
+        return filename
+    
+    def execute(self, analysis_data: Dict[str, Any], suggestions_data: Dict[str, Any],
+                include_content: bool = True) -> Dict[str, Any]:
+        """Generate comprehensive portfolio report with dynamic user preferences.
+
+        With include_content=False the returned dict carries only the
+        filename and summary; the markdown goes straight to disk as chunks
+        and the joined string is never materialized.
+        """
+        logger.info(f"{self.name}: Generating comprehensive portfolio report...")
+
+        try:
+            # Single clock read for the whole execute; the render pass, the
+            # saved filename and the result timestamp all agree on it
+            now = datetime.now()
+
+            # Nothing to report on - emit a minimal stub instead of the
+            # full ~2 KB scaffolding the template pipeline would produce
+            if analysis_data.get('status') == 'error' or not analysis_data.get('analysis'):
+                return self._build_error_report(analysis_data, now, include_content)
+
+            digest = self._input_digest(analysis_data, suggestions_data)
+            cache_key = None if digest is None else (digest, include_content)
+            if cache_key is not None and cache_key in self._result_cache:
+                self._result_cache.move_to_end(cache_key)
+                logger.info(f"{self.name}: Returning cached report for identical inputs")
+                # Hand out a copy so caller mutations cannot poison the
+                # cached entry, stamped with this run's clock
+                hit = dict(self._result_cache[cache_key])
+                hit['timestamp'] = now.isoformat()
+                return hit
+
+            # Unpack user preferences once; both generators consume the result
+            ctx = self._build_user_context(suggestions_data)
+
+            # Second cache level: rendered markdown persisted under
+            # reports/.cache survives process restarts
+            cached_md = None if digest is None else self._disk_cache_path(digest)
+            if cached_md is not None and os.path.exists(cached_md):
+                logger.info(f"{self.name}: Reusing rendered report from disk cache")
+                report_parts = None
+                filename = self._publish_cached(cached_md, now)
+            else:
+                # Generate the report as section chunks; they are written to
+                # disk as-is and only joined when the caller wants the content
+                report_parts = self._build_report_parts(analysis_data, suggestions_data, ctx, now)
+
+                # Save report to file, and keep a copy in the disk cache
+                filename = self._save_report(report_parts, now)
+                if cached_md is not None:
+                    self._submit_write(_write_chunks, cached_md, report_parts)
+
+            # Generate executive summary
+            exec_summary = self._generate_executive_summary(analysis_data, suggestions_data, ctx)
+
+            logger.info(f"{self.name}: Comprehensive report generated successfully: {filename}")
+
+            result = {
+                'status': 'success',
+                'filename': filename,
+                'executive_summary': exec_summary,
+                'timestamp': now.isoformat()
+            }
+            if include_content:
+                if report_parts is not None:
+                    result['content'] = ''.join(report_parts)
+                else:
+                    with open(cached_md, 'r', encoding='utf-8') as f:
+                        result['content'] = f.read()
+            if cache_key is not None:
+                # Store a copy for the same reason hits return one
+                self._result_cache[cache_key] = dict(result)
+                if len(self._result_cache) > self._CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
+            return result
+
+        except Exception as e:
+            logger.error(f"{self.name}: Report generation error: {e}")
+            return {
+                'status': 'error',
+                'error': str(e),
+                'timestamp': self._get_timestamp()
+            }
+    
+    def _build_error_report(self, analysis_data: Dict, now: datetime,
+                            include_content: bool) -> Dict[str, Any]:
+        """Write and describe the minimal stub used when analysis failed"""
+        reason = str(analysis_data.get('error', 'No analysis data available'))
+        content = _ERROR_REPORT_TMPL.format(
+            timestamp=now.strftime("%B %d, %Y at %I:%M %p"), reason=reason
+        )
+        filename = self._save_report([content], now)
+        logger.warning(f"{self.name}: No analysis data; wrote minimal report {filename}")
+        result = {
+            'status': 'success',
+            'filename': filename,
+            'executive_summary': f"Portfolio analysis unavailable: {reason}",
+            'timestamp': now.isoformat()
+        }
+        if include_content:
+            result['content'] = content
+        return result
+
+    # Per-run noise in the upstream result envelopes: fresh timestamps and
+    # truncated raw LLM text that never reach the rendered report
+    _VOLATILE_FIELDS = frozenset(('timestamp', 'raw_analysis', 'raw_suggestions'))
+
+    @classmethod
+    def _input_digest(cls, analysis_data: Dict, suggestions_data: Dict):
+        """Stable 16-byte digest of both inputs, or None if unhashable.
+
+        The envelopes carry fields that change every pipeline run without
+        affecting the output (each agent stamps its result); hashing them
+        would give every run a fresh digest and the restart-surviving disk
+        cache could never hit, so they are dropped before hashing.
+        """
+        stable = [
+            {k: v for k, v in d.items() if k not in cls._VOLATILE_FIELDS}
+            for d in (analysis_data, suggestions_data)
+        ]
+        try:
+            payload = json_dumps(stable, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.blake2b(payload, digest_size=16).digest()
+
+    @staticmethod
+    def to_json(result: Dict[str, Any]) -> bytes:
+        """Serialize an execute() result for API/IPC boundaries.
+
+        Goes through the shared orjson-backed helper, which is several
+        times faster than stdlib json and handles datetimes via str().
+        """
+        return json_dumps(result)
+
+    def _build_user_context(self, suggestions_data: Dict) -> _UserContext:
+        """Run the preference unpacking and safe casts exactly once"""
+        suggestions = suggestions_data.get('suggestions', {})
+        user_preferences = suggestions.get('user_preferences_applied', {})
+
+        # Bind each group's .get (and the converters) to locals: every
+        # lookup below then skips the attribute resolution step
+        basic = user_preferences.get('basic_info', {}).get
+        goal = user_preferences.get('investment_goals', {}).get
+        risk = user_preferences.get('risk_preferences', {}).get
+        pref = user_preferences.get('portfolio_preferences', {}).get
+        limit = user_preferences.get('constraints', {}).get
+        safe_int, safe_float = self._safe_int, self._safe_float
+
+        return _UserContext(
+            user_age=self._safe_str(basic('age', 'N/A')),
+            experience_level=str(basic('experience_level', 'N/A')),
+            primary_goal=str(goal('primary_goal', 'Not specified')),
+            time_horizon=str(goal('time_horizon', 'Not specified')),
+            expected_return=safe_float(goal('expected_return', 0)),
+            monthly_addition=safe_int(goal('monthly_addition', 0)),
+            target_corpus=safe_int(goal('target_corpus', 0)),
+            risk_tolerance=str(risk('risk_tolerance', 'Not specified')),
+            risk_score=safe_int(risk('risk_score', 3)),
+            equity_preference=safe_int(pref('preferred_equity_allocation', 70)),
+            preferred_sectors=tuple(pref('preferred_sectors', ())),
+            additional_budget=safe_int(limit('additional_investment_budget', 0)),
+            monthly_liquidity=safe_int(limit('liquidity_amount', 0)),
+            liquidity_frequency=str(limit('liquidity_frequency', 'N/A')),
+            liquidity_needs=bool(limit('liquidity_needs', False)),
+            existing_action=str(limit('existing_portfolio_action', 'modify')),
+            collection_date=str(basic('collection_date', ''))
+        )
+
+    def _generate_comprehensive_report_content(self, analysis_data: Dict, suggestions_data: Dict,
+                                               ctx: _UserContext = None) -> str:
+        """Generate comprehensive formatted report content with dynamic user preferences"""
+        return ''.join(self._build_report_parts(analysis_data, suggestions_data, ctx))
+
+    def render_into(self, writer, analysis_data: Dict, suggestions_data: Dict) -> None:
+        """Stream the rendered report into a caller-supplied text writer.
+
+        Useful for HTTP handlers and the like: the section chunks go
+        straight to writer.write(), so the full report is never joined
+        into one string on top of whatever buffer the caller holds.
+        """
+        write = writer.write
+        for chunk in self._build_report_parts(analysis_data, suggestions_data):
+            write(chunk)
+
+    def _build_report_parts(self, analysis_data: Dict, suggestions_data: Dict,
+                            ctx: _UserContext = None, now: datetime = None) -> List[str]:
+        """Render the report as a list of section chunks"""
+        # One clock read per report; reused for the header, footer and
+        # next-review date instead of three datetime.now() calls
+        if now is None:
+            now = datetime.now()
+        timestamp = now.strftime("%B %d, %Y at %I:%M %p")
+
+        # Extract data with proper defaults
+        analysis = analysis_data.get('analysis', {})
+        suggestions = suggestions_data.get('suggestions', {})
+
+        # USER PREFERENCES extracted once per execute(); build here only
+        # when called standalone
+        if ctx is None:
+            ctx = self._build_user_context(suggestions_data)
+        additional_budget = ctx.additional_budget
+        monthly_liquidity = ctx.monthly_liquidity
+        liquidity_frequency = ctx.liquidity_frequency
+        liquidity_needs = ctx.liquidity_needs
+        preferred_sectors = ctx.preferred_sectors
+        risk_tolerance = ctx.risk_tolerance
+        primary_goal = ctx.primary_goal
+        time_horizon = ctx.time_horizon
+        expected_return = ctx.expected_return
+        monthly_addition = ctx.monthly_addition
+        target_corpus = ctx.target_corpus
+        user_age = ctx.user_age
+        experience_level = ctx.experience_level
+        equity_preference = ctx.equity_preference
+        risk_score = ctx.risk_score
+        existing_action = ctx.existing_action
+        # Normalized-case variants computed once; the templates reference
+        # these instead of re-lowercasing per use
+        liquidity_frequency_lc = liquidity_frequency.lower()
+        experience_lc = experience_level.lower()
+        primary_goal_lc = primary_goal.lower()
+        risk_tolerance_lc = risk_tolerance.lower()
+
+        # Extract analysis data, normalizing the list-valued fields once so
+        # the sections below never re-check their types
+        exec_summary = analysis.get('executive_summary', {})
+        holdings_analysis = _as_list(analysis.get('holdings_analysis'))
+        sector_analysis = analysis.get('sector_analysis', {})
+        key_insights = _as_list(analysis.get('key_insights'))
+        risk_warnings = _as_list(analysis.get('risk_warnings'))
+        opportunities = _as_list(analysis.get('opportunities'))
+
+        # Extract suggestions data
+        personalized_analysis = suggestions.get('personalized_analysis', {})
+        existing_portfolio_action = suggestions.get('existing_portfolio_action', {})
+        new_investments = _as_list(suggestions.get('new_investments'))
+        implementation_strategy = suggestions.get('implementation_strategy', {})
+        risk_management = suggestions.get('risk_management', {})
+        goal_alignment = suggestions.get('goal_alignment', {})
         
-        return report
+        # Resolve repeated lookups once, then render the precompiled sections
+        total_investment = self._safe_float(exec_summary.get('total_investment', 0))
+        current_value = self._safe_float(exec_summary.get('current_value', 0))
+        total_pnl = self._safe_float(exec_summary.get('total_pnl', 0))
+        total_pnl_pct = self._safe_float(exec_summary.get('total_pnl_percentage', 0))
+        holdings_count = self._safe_int(exec_summary.get('number_of_holdings', 0))
+        time_to_goal = self._calculate_time_to_goal(
+            target_corpus, current_value, monthly_addition, additional_budget
+        )
+        preferred_sectors_str = ', '.join(preferred_sectors) if preferred_sectors else 'No specific sector preferences'
+        # Lowercase each preference once; the sector and investment loops
+        # below were re-lowercasing the full preference list per row
+        pref_lower = tuple(pref.lower() for pref in preferred_sectors)
+
+        # Accumulate sections in a list and join once - linear-time assembly
+        # instead of reallocating the growing report string per append
+        parts = [_REPORT_HEADER_TMPL.format(
+            timestamp=timestamp,
+            user_age=user_age,
+            experience_level=experience_level,
+            primary_goal=primary_goal,
+            time_horizon=time_horizon,
+            risk_tolerance=risk_tolerance,
+            expected_return=expected_return,
+            equity_preference=equity_preference,
+            additional_budget=additional_budget,
+            monthly_addition=monthly_addition,
+            target_corpus=target_corpus
+        )]
+
+        if liquidity_needs and monthly_liquidity > 0:
+            parts.append(_LIQUIDITY_NEEDS_TMPL.format(
+                monthly_liquidity=monthly_liquidity,
+                liquidity_frequency=liquidity_frequency_lc
+            ))
+        else:
+            parts.append(_NO_LIQUIDITY_BLOCK)
+
+        value_icon, pnl_word = _PNL_STYLE[total_pnl < 0]
+        parts.append(_PORTFOLIO_ANALYSIS_TMPL.format(
+            preferred_sectors_str=preferred_sectors_str,
+            existing_action_title=existing_action.title(),
+            total_investment=total_investment,
+            current_value=current_value,
+            value_icon=value_icon,
+            total_pnl=total_pnl,
+            total_pnl_pct=total_pnl_pct,
+            pnl_word=pnl_word,
+            holdings_count=holdings_count,
+            diversification_status=_DIVERSIFICATION_STYLE[holdings_count < 5],
+            target_corpus=target_corpus,
+            gap_to_target=max(0, target_corpus - current_value),
+            time_to_goal=time_to_goal
+        ))
+
+        # Add holdings analysis with safety check
+        if holdings_analysis:
+            # Bind the template's format method once; per-row attribute
+            # lookup is pure overhead inside the loop
+            holding_row = _HOLDING_ENTRY_TMPL.format
+            nums = None
+            if len(holdings_analysis) > _VECTORIZE_THRESHOLD:
+                # Large portfolios: coerce the numeric columns in C via one
+                # float64 array instead of per-row _safe_float calls. Only
+                # the numbers are vectorized - symbol, sector and
+                # recommendation stay Python strings, because fixed-width
+                # numpy unicode fields would silently clip them to the
+                # dtype length. Non-numeric values ("N/A" P&L and friends)
+                # make the C-level coercion throw; fall back to the scalar
+                # path below, which routes everything through _safe_float
+                try:
+                    nums = np.array(
+                        [(h.get('pnl') or 0, h.get('pnl_percentage') or 0,
+                          h.get('weight_in_portfolio') or 0)
+                         for h in holdings_analysis],
+                        dtype=np.float64
+                    )
+                except (ValueError, TypeError):
+                    logger.debug("Holdings not numerically clean, "
+                                 "using scalar coercion path")
+            if nums is not None:
+                np.nan_to_num(nums, copy=False)
+                for i, (holding, row) in enumerate(zip(holdings_analysis, nums), 1):
+                    parts.append(holding_row(
+                        index=i,
+                        symbol=str(holding.get('symbol', f'Holding {i}')),
+                        sector=str(holding.get('sector', 'N/A')),
+                        pnl=row[0], pnl_pct=row[1], weight=row[2],
+                        recommendation=holding.get('recommendation', 'Review')
+                    ))
+            else:
+                # Feed the rows through extend in one call; the list grows
+                # once instead of rebinding append per iteration
+                safe_float = self._safe_float
+                parts.extend(
+                    holding_row(
+                        index=i,
+                        symbol=str(holding.get('symbol', f'Holding {i}')),
+                        sector=str(holding.get('sector', 'N/A')),
+                        pnl=safe_float(holding.get('pnl', 0)),
+                        pnl_pct=safe_float(holding.get('pnl_percentage', 0)),
+                        weight=safe_float(holding.get('weight_in_portfolio', 0)),
+                        recommendation=holding.get('recommendation', 'Review')
+                    )
+                    for i, holding in enumerate(holdings_analysis, 1)
+                )
+        else:
+            parts.append("Current portfolio shows high concentration - detailed analysis needed.\n\n")
+
+        # Sector Analysis
+        sector_allocation = _as_list(sector_analysis.get('sector_allocation'))
+        parts.append(_SECTOR_SECTION_HEADER)
+
+        if sector_allocation:
+            # Pre-bound row formatter avoids re-parsing the format spec per row
+            sector_row = "**{}:** {:.1f}% (₹{:,.0f}) - {}\n".format
+            for sector in islice(sector_allocation, _MAX_SECTOR_ROWS):
+                sector_name = str(sector.get('sector', 'N/A'))
+                sector_pct = self._safe_float(sector.get('percentage', 0))
+                sector_value = self._safe_float(sector.get('value', 0))
+
+                # Check if this sector is in user preferences
+                sector_name_lower = sector_name.lower()
+                preference_match = "✅ Preferred" if any(pref in sector_name_lower for pref in pref_lower) else "⚪ Not in preferences"
+
+                parts.append(sector_row(sector_name, sector_pct, sector_value, preference_match))
+        else:
+            parts.append("**Current:** 100% concentrated in single unknown sector\n")
+
+        if preferred_sectors:
+            alloc_lower = {str(alloc.get('sector', '')).lower() for alloc in sector_allocation}
+            missing_sectors = [sector for sector in preferred_sectors if sector.lower() not in alloc_lower]
+            if missing_sectors:
+                parts.append(_MISSING_SECTORS_TMPL.format(
+                    missing_sectors_str=', '.join(missing_sectors)
+                ))
+
+        # Key Insights
+        parts.append(_INSIGHTS_HEADER)
+
+        if key_insights:
+            # islice bounds the loop without allocating a slice copy
+            for i, insight in enumerate(islice(key_insights, 5), 1):
+                parts.append(f"{i}. {insight}\n")
+        else:
+            # Generate insights based on user profile
+            parts.append(f"1. As a {user_age}-year-old {experience_lc} investor, your portfolio needs diversification\n")
+            parts.append(f"2. Your {primary_goal_lc} goal requires strategic sector allocation\n")
+            parts.append(f"3. With {risk_tolerance_lc} risk tolerance, current concentration is concerning\n")
+
+        # Personalized Recommendations Section
+        parts.append(_RECOMMENDATIONS_HEADER)
+
+        if personalized_analysis:
+            parts.append(_ASSESSMENT_TMPL.format(
+                alignment=str(personalized_analysis.get('alignment_with_goals', f'Portfolio needs restructuring to align with {primary_goal}')),
+                risk_assess=str(personalized_analysis.get('risk_assessment', f'Risk level needs adjustment for {risk_tolerance}')),
+                gap_analysis=str(personalized_analysis.get('gap_analysis', f'Missing exposure to preferred sectors: {", ".join(preferred_sectors[:3])}'))
+            ))
+        else:
+            parts.append(_ASSESSMENT_TMPL.format(
+                alignment=f'Your {primary_goal} goal requires strategic changes to current portfolio structure',
+                risk_assess=f"Current portfolio risk doesn't match your {risk_tolerance} profile",
+                gap_analysis=f"Missing diversification across your preferred sectors: {', '.join(preferred_sectors[:3]) if preferred_sectors else 'multiple sectors'}"
+            ))
+
+        # Investment Recommendations based on Budget
+        parts.append(_INVESTMENT_STRATEGY_TMPL.format(
+            additional_budget=additional_budget,
+            monthly_addition=monthly_addition,
+            annual_capacity=additional_budget + (monthly_addition * 12)
+        ))
+
+        if additional_budget > 0 or monthly_addition > 0:
+            parts.append(_ALLOCATION_HEADER_TMPL.format(
+                preferred_sectors_str=preferred_sectors_str
+            ))
+
+            if new_investments:
+                investment_row = _INVESTMENT_ENTRY_TMPL.format
+                for investment in islice(new_investments, 5):  # Limit to top 5
+                    sector = str(investment.get('sector', 'N/A'))
+
+                    # Check if sector matches user preference
+                    sector_match = "✅ Matches your preference" if any(pref in sector.lower() for pref in pref_lower) else "🔍 Strategic addition"
+
+                    parts.append(investment_row(
+                        symbol=str(investment.get('symbol', 'N/A')),
+                        sector=sector,
+                        sector_match=sector_match,
+                        allocation_amt=self._safe_int(investment.get('allocation_amount', 0)),
+                        allocation_pct=self._safe_float(investment.get('allocation_percentage', 0)),
+                        priority=str(investment.get('priority', 'Medium')),
+                        timeline=str(investment.get('timeline', 'Immediate')),
+                        rationale=str(investment.get('rationale', 'Aligns with your sector preferences'))
+                    ))
+            else:
+                # Generate fallback recommendations based on user preferences
+                if preferred_sectors:
+                    budget_per_sector = additional_budget // max(len(preferred_sectors[:4]), 1)  # Top 4 preferred sectors
+
+                    for sector in preferred_sectors[:4]:
+                        if sector in _SECTOR_STOCKS:
+                            stock, description = _SECTOR_STOCKS[sector]
+                            parts.append(_FALLBACK_STOCK_TMPL.format(
+                                stock=stock,
+                                sector=sector,
+                                budget_per_sector=budget_per_sector,
+                                description=description
+                            ))
+
+        # Liquidity Management Strategy
+        if liquidity_needs and monthly_liquidity > 0:
+            total_portfolio = max(current_value + additional_budget, 1)
+            liquidity_percentage = (monthly_liquidity * 12) / total_portfolio * 100
+
+            parts.append(_LIQUIDITY_STRATEGY_TMPL.format(
+                monthly_liquidity=monthly_liquidity,
+                liquidity_frequency=liquidity_frequency_lc,
+                annual_liquidity=self._calculate_annual_liquidity(monthly_liquidity, liquidity_frequency),
+                liquidity_percentage=liquidity_percentage,
+                dividend_pct=min(25, liquidity_percentage + 5),
+                liquid_pct=max(10, liquidity_percentage)
+            ))
+
+        # Calculate next review date
+        next_review = now + timedelta(days=30)
+
+        # Conclusion
+        parts.append(_CONCLUSION_TMPL.format(
+            user_age=user_age,
+            experience_lower=experience_lc,
+            primary_goal=primary_goal,
+            primary_goal_lower=primary_goal_lc,
+            time_horizon_lower=time_horizon.lower(),
+            risk_tolerance=risk_tolerance,
+            risk_lower=risk_tolerance_lc,
+            expected_return=expected_return,
+            additional_budget=additional_budget,
+            monthly_addition=monthly_addition,
+            sector_focus=', '.join(preferred_sectors[:3]) if preferred_sectors else 'Diversified approach',
+            sector_focus_footer=', '.join(preferred_sectors[:3]) if preferred_sectors else 'diversified investing',
+            sector_count=len(preferred_sectors) if preferred_sectors else 3,
+            liquidity_step=f'₹{monthly_liquidity:,} {liquidity_frequency_lc} withdrawal' if liquidity_needs else 'quarterly review',
+            stop_loss_pct=10 if risk_score <= 2 else 15,
+            target_corpus=target_corpus,
+            time_to_goal=time_to_goal,
+            income_metric='₹{:,} {} income'.format(monthly_liquidity, liquidity_frequency_lc) if liquidity_needs else 'consistent growth',
+            timestamp=timestamp,
+            next_review=next_review.strftime('%B %d, %Y'),
+            collection_date=(ctx.collection_date or timestamp)[:10]
+        ))
+
+        return parts
     
     def _safe_int(self, value) -> int:
         """Safely convert value to integer"""
         try:
-            if isinstance(value, str) and value.lower() in ['n/a', 'none', '']:
-                return 0
-            return int(float(str(value)) if value is not None else 0)
-        except (ValueError, TypeError):
-            return 0
-    
+            return _coerce_int(value)
+        except TypeError:  # unhashable input - convert without the cache
+            return _coerce_int(str(value))
+
     def _safe_float(self, value) -> float:
         """Safely convert value to float"""
         try:
-            if isinstance(value, str) and value.lower() in ['n/a', 'none', '']:
-                return 0.0
-            return float(str(value)) if value is not None else 0.0
-        except (ValueError, TypeError):
-            return 0.0
-    
+            return _coerce_float(value)
+        except TypeError:
+            return _coerce_float(str(value))
+
     def _safe_str(self, value) -> str:
         """Safely convert value to string"""
         if value is None:
@@ -407,88 +963,79 @@ Based on your preferred sectors: {preferred_sectors_str}
     
     def _calculate_time_to_goal(self, target: int, current: float, monthly: int, additional: int) -> float:
         """Calculate time to reach investment goal"""
-        try:
-            gap = max(0, target - current)
-            annual_capacity = monthly * 12 + additional
-            if annual_capacity <= 0:
-                return 10.0  # Default 10 years if no investment capacity
-            return gap / annual_capacity
-        except:
-            return 10.0
-    
+        return _time_to_goal(target, round(current, 2), monthly, additional)
+
     def _calculate_annual_liquidity(self, monthly_liquidity: int, frequency: str) -> int:
         """Calculate annual liquidity requirement"""
-        frequency_lower = frequency.lower()
-        if 'monthly' in frequency_lower:
-            return monthly_liquidity * 12
-        elif 'quarterly' in frequency_lower:
-            return monthly_liquidity * 4
-        elif 'half' in frequency_lower or 'semi' in frequency_lower:
-            return monthly_liquidity * 2
-        else:
-            return monthly_liquidity * 4  # Default quarterly
-    
-    def _generate_executive_summary(self, analysis_data: Dict, suggestions_data: Dict) -> str:
+        return _annual_liquidity(monthly_liquidity, frequency)
+
+    def _generate_executive_summary(self, analysis_data: Dict, suggestions_data: Dict,
+                                    ctx: _UserContext = None) -> str:
         """Generate executive summary with dynamic user preferences"""
         analysis = analysis_data.get('analysis', {})
         suggestions = suggestions_data.get('suggestions', {})
-        user_preferences = suggestions.get('user_preferences_applied', {})
-        
-        # Extract user-specific data
-        goals = user_preferences.get('investment_goals', {})
-        constraints = user_preferences.get('constraints', {})
-        basic_info = user_preferences.get('basic_info', {})
-        
+
+        # Reuse the per-execute preference context instead of re-unpacking
+        if ctx is None:
+            ctx = self._build_user_context(suggestions_data)
+
         exec_summary = analysis.get('executive_summary', {})
-        
-        additional_budget = self._safe_int(constraints.get('additional_investment_budget', 0))
-        monthly_addition = self._safe_int(goals.get('monthly_addition', 0))
-        primary_goal = str(goals.get('primary_goal', 'Investment Growth'))
-        user_age = self._safe_str(basic_info.get('age', 'N/A'))
-        
-        immediate_actions = suggestions.get('immediate_actions', suggestions.get('new_investments', []))
-        
-        summary = f"""
-PERSONALIZED PORTFOLIO EXECUTIVE SUMMARY
-=======================================
 
-INVESTOR PROFILE: {user_age}-year-old pursuing {primary_goal}
+        additional_budget = ctx.additional_budget
+        monthly_addition = ctx.monthly_addition
+        primary_goal = ctx.primary_goal if ctx.primary_goal != 'Not specified' else 'Investment Growth'
+        user_age = ctx.user_age
 
-CURRENT PORTFOLIO:
-Total Investment: ₹{self._safe_float(exec_summary.get('total_investment', 0)):,.2f}
-Current Value: ₹{self._safe_float(exec_summary.get('current_value', 0)):,.2f}  
-P&L: ₹{self._safe_float(exec_summary.get('total_pnl', 0)):,.2f} ({self._safe_float(exec_summary.get('total_pnl_percentage', 0)):+.2f}%)
+        immediate_actions = suggestions.get('immediate_actions', suggestions.get('new_investments', []))
 
-INVESTMENT CAPACITY:
-Additional Budget: ₹{additional_budget:,}
-Monthly SIP: ₹{monthly_addition:,}
-Total Annual Capacity: ₹{additional_budget + (monthly_addition * 12):,}
+        safe_float = self._safe_float
+        parts = [_EXEC_SUMMARY_TMPL.format(
+            user_age=user_age,
+            primary_goal=primary_goal,
+            total_investment=safe_float(exec_summary.get('total_investment', 0)),
+            current_value=safe_float(exec_summary.get('current_value', 0)),
+            total_pnl=safe_float(exec_summary.get('total_pnl', 0)),
+            total_pnl_pct=safe_float(exec_summary.get('total_pnl_percentage', 0)),
+            additional_budget=additional_budget,
+            monthly_addition=monthly_addition,
+            annual_capacity=additional_budget + (monthly_addition * 12),
+        )]
 
-PERSONALIZED IMMEDIATE ACTIONS:
-"""
-        
         if immediate_actions and isinstance(immediate_actions, list):
-            for i, action in enumerate(immediate_actions[:3], 1):
+            for i, action in enumerate(islice(immediate_actions, 3), 1):
                 action_name = str(action.get('action', action.get('symbol', 'Portfolio Action')))
                 priority = str(action.get('priority', 'High'))
-                summary += f"{i}. {action_name} (Priority: {priority})\n"
+                parts.append(f"{i}. {action_name} (Priority: {priority})\n")
         else:
-            summary += f"1. Deploy ₹{additional_budget:,} across preferred sectors (Priority: High)\n"
-            summary += f"2. Set up ₹{monthly_addition:,} monthly SIP (Priority: High)\n"
-            summary += f"3. Implement risk management for {primary_goal} (Priority: Medium)\n"
-        
-        return summary
+            parts.append(f"1. Deploy ₹{additional_budget:,} across preferred sectors (Priority: High)\n")
+            parts.append(f"2. Set up ₹{monthly_addition:,} monthly SIP (Priority: High)\n")
+            parts.append(f"3. Implement risk management for {primary_goal} (Priority: Medium)\n")
+
+        return ''.join(parts)
     
-    def _save_report(self, content: str) -> str:
-        """Save comprehensive report to file"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def _save_report(self, parts, now: datetime = None) -> str:
+        """Save comprehensive report to file.
+
+        Accepts either the section-chunk list or a whole string; chunks
+        are encoded and written one by one on the I/O pool, so the full
+        report is never duplicated as one large bytes buffer.
+        """
+        self._ensure_reports_dir()
+        timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S")
         filename = f"personalized_portfolio_analysis_{timestamp}.md"
         filepath = os.path.join(self.reports_dir, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
+
+        if isinstance(parts, str):
+            parts = [parts]
+        self._submit_write(_write_chunks, filepath, parts)
+
         return filename
+
+    def flush(self):
+        """Block until all background report writes have completed"""
+        pending, self._pending_writes = self._pending_writes, []
+        for future in pending:
+            future.result()
     
     def _get_timestamp(self) -> str:
         return datetime.now().isoformat()
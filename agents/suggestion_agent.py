@@ -1,30 +1,273 @@
 # agents/suggestion_agent.py
+import hashlib
 import logging
 import json
+import os
 import re
-from typing import Dict, Any, Optional
+import string
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional
 from config.settings import Config
 from utils.api_handler import gemini_handler
+from utils.json_utils import (
+    extract_first_json, strip_line_comments,
+    dumps as json_dumps, loads as json_loads
+)
 from agents.preference_agent import UserPreferenceAgent
 
 logger = logging.getLogger(__name__)
 
+# Precompiled response-cleanup patterns, shared by every parse attempt -
+# same compile-once convention as the analyzer
+_RE_FENCE = re.compile(r'```')
+_RE_FENCE_BLOCK = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_RE_TRAIL_OBJ = re.compile(r',\s*}')
+_RE_TRAIL_ARR = re.compile(r',\s*]')
+
+# Fallback stock pools by risk appetite; rows are treated as read-only
+# prototypes and merged into fresh dicts when ideas are built
+_SAFE_STOCKS = (
+    {"symbol": "HDFCBANK", "sector": "Banking", "rationale": "Stable large-cap banking leader"},
+    {"symbol": "HINDUNILVR", "sector": "FMCG", "rationale": "Defensive consumer goods"},
+    {"symbol": "NESTLEIND", "sector": "FMCG", "rationale": "Quality consumer brand"}
+)
+_GROWTH_STOCKS = (
+    {"symbol": "RELIANCE", "sector": "Energy", "rationale": "Diversified conglomerate"},
+    {"symbol": "HCLTECH", "sector": "IT", "rationale": "Technology growth potential"},
+    {"symbol": "ASIANPAINT", "sector": "Consumer", "rationale": "Market leader in paints"}
+)
+
+# Pre-serialized skeleton for the personalized-suggestions fallback - the
+# constant text (~70% of the payload) is cloned by re-parsing this string
+# and only the preference-dependent slots are patched per call, mirroring
+# the analyzer's structured-fallback prototype
+_FALLBACK_SUGGESTIONS_PROTO_JSON = json.dumps({
+    "personalized_analysis": {
+        "alignment_with_goals": "",
+        "risk_assessment": "",
+        "gap_analysis": ""
+    },
+    "existing_portfolio_action": {
+        "recommendation": "",
+        "rationale": "",
+        "specific_changes": [
+            "",
+            "Gradual rebalancing over 2-3 months to minimize market impact"
+        ]
+    },
+    "new_investments": [],
+    "implementation_strategy": {
+        "phase_1_immediate": {
+            "budget_required": 0,
+            "actions": [
+                "Deploy additional corpus in chosen stocks",
+                "Set up systematic investment plan"
+            ],
+            "timeframe": "Next 2 weeks"
+        },
+        "phase_2_monthly_sip": {
+            "monthly_amount": 0,
+            "allocation_split": {},
+            "duration": "12-24 months for full deployment"
+        },
+        "phase_3_additional_corpus": {
+            "when_to_deploy": "",
+            "deployment_strategy": "Dollar cost averaging to reduce timing risk"
+        }
+    },
+    "risk_management": {
+        "position_sizing": "",
+        "stop_loss_strategy": "",
+        "rebalancing_frequency": "Quarterly review with annual rebalancing",
+        "emergency_fund": "Maintain 6 months expenses before additional investments"
+    },
+    "goal_alignment": {
+        "target_corpus": 0,
+        "expected_timeline": "",
+        "probability_of_success": "",
+        "adjustments_needed": ""
+    },
+    "preferences_applied": {
+        "sectors_focused": [],
+        "sectors_avoided": [],
+        "risk_alignment": "",
+        "budget_utilization": ""
+    },
+    "fallback_note": "Personalized recommendations based on user preferences and portfolio analysis"
+})
+
+# Shared constant for the invalid-input early return; the proxy keeps the
+# template immutable and each caller gets a cheap shallow copy
+_INVALID_INPUT_RESPONSE = MappingProxyType({
+    'status': 'error',
+    'error': 'Invalid analysis data provided'
+})
+
+# Pre-serialized default-preference profile - cloned per call by re-parsing
+# the constant JSON string, the same prototype trick the analyzer's
+# structured fallback uses; callers get a fresh mutable dict each time
+_DEFAULT_PREFS_PROTO_JSON = json.dumps({
+    'investment_goals': {
+        'primary_goal': 'Wealth Creation',
+        'time_horizon': 'Long-term (5-10 years)',
+        'expected_return': 12.0,
+        'monthly_addition': 10000,
+        'target_corpus': 5000000
+    },
+    'risk_preferences': {
+        'risk_tolerance': 'Moderate (Balanced growth)',
+        'risk_score': 3,
+        'max_acceptable_drawdown': 15.0
+    },
+    'portfolio_preferences': {
+        'preferred_equity_allocation': 70,
+        'preferred_sectors': [],
+        'diversification_preference': 8
+    },
+    'constraints': {
+        'additional_investment_budget': 0,
+        'avoid_sectors': [],
+        'existing_portfolio_action': 'modify'
+    },
+    'basic_info': {
+        'age': 35,
+        'experience_level': 'Intermediate'
+    }
+})
+
+# Static suggestion-prompt skeleton - parsed once at import like the
+# analyzer's prompt; per-call work is just filling the preference slots
+_SUGGESTION_PROMPT_TMPL = string.Template("""
+You are a personalized investment advisor. Create investment suggestions based on the portfolio analysis AND the specific user preferences provided.
+
+PORTFOLIO ANALYSIS:
+- Investment: ₹$total_investment
+- P&L: $pnl_percentage%
+- Holdings: $holdings_count
+
+USER PROFILE & PREFERENCES:
+- Age: $age | Experience: $experience_level
+- Primary Goal: $primary_goal
+- Time Horizon: $time_horizon
+- Risk Tolerance: $risk_tolerance
+- Expected Return: $expected_return%
+- Equity Preference: $equity_preference%
+- Monthly Addition: ₹$monthly_addition
+- Additional Budget: ₹$additional_budget
+- Preferred Sectors: $preferred_sectors
+- Avoid Sectors: $avoid_sectors
+- Portfolio Size Preference: $diversification_preference holdings
+- Existing Portfolio Action: $existing_action
+
+Return suggestions in JSON format that specifically address:
+1. How to handle existing portfolio based on user preference
+2. New investments aligned with preferred sectors and risk tolerance
+3. Implementation considering monthly additions and additional budget
+4. Risk management appropriate for user's risk tolerance
+
+{
+  "personalized_analysis": {
+    "alignment_with_goals": "How current portfolio aligns with user goals",
+    "risk_assessment": "Portfolio risk vs user risk tolerance",
+    "gap_analysis": "What's missing based on preferences"
+  },
+  "existing_portfolio_action": {
+    "recommendation": "hold/modify/partial_exit based on user preference",
+    "rationale": "Why this action suits user profile",
+    "specific_changes": ["Specific changes to make"]
+  },
+  "new_investments": [
+    {
+      "symbol": "STOCK_SYMBOL",
+      "sector": "Sector from preferred list",
+      "allocation_amount": "Amount in ₹",
+      "allocation_percentage": "% of total portfolio",
+      "rationale": "Why this fits user preferences",
+      "priority": "High/Medium/Low",
+      "timeline": "When to invest"
+    }
+  ],
+  "implementation_strategy": {
+    "phase_1_immediate": {
+      "budget_required": "₹ needed for immediate actions",
+      "actions": ["Immediate steps"],
+      "timeframe": "Timeline"
+    },
+    "phase_2_monthly_sip": {
+      "monthly_amount": "$monthly_addition",
+      "allocation_split": {"sector1": "percentage", "sector2": "percentage"},
+      "duration": "How long to continue SIP"
+    },
+    "phase_3_additional_corpus": {
+      "when_to_deploy": "Timing for additional ₹$additional_budget",
+      "deployment_strategy": "How to invest additional corpus"
+    }
+  },
+  "risk_management": {
+    "position_sizing": "Max % per holding based on risk tolerance",
+    "stop_loss_strategy": "Appropriate for user risk profile",
+    "rebalancing_frequency": "Based on user involvement preference",
+    "emergency_fund": "Liquidity requirements based on user needs"
+  },
+  "goal_alignment": {
+    "target_corpus": "$target_corpus",
+    "expected_timeline": "Time to reach target",
+    "probability_of_success": "Based on expected returns and risk",
+    "adjustments_needed": "If goals seem unrealistic"
+  }
+}
+
+Ensure all recommendations are specifically tailored to the user's preferences, constraints, and goals.
+""")
+
 class SuggestionEngineAgent:
     """Enhanced suggestion agent that uses user preferences for personalized recommendations"""
-    
+
+    # On-disk memo of parsed LLM suggestions keyed by an input digest -
+    # repeated runs over unchanged data skip the Gemini round-trip (and
+    # its quota) entirely
+    _cache_dir = os.path.join('.cache', 'suggestions')
+    _cache_dir_ready = False
+
     def __init__(self, name: str = "SuggestionEngineAgent"):
         self.name = name
         self.config = Config()
+
+    @classmethod
+    def _ensure_cache_dir(cls):
+        """Create the suggestion cache directory once per process"""
+        if not cls._cache_dir_ready:
+            os.makedirs(cls._cache_dir, exist_ok=True)
+            cls._cache_dir_ready = True
+
+    @staticmethod
+    def _input_digest(analysis: Dict, preferences: Dict) -> Optional[str]:
+        """Stable digest of the analysis + preferences, or None if unhashable"""
+        try:
+            payload = json_dumps([analysis, preferences], sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _store_cached_suggestions(self, cache_path: str, suggestions: Dict) -> None:
+        """Persist parsed suggestions, atomically like the report cache"""
+        try:
+            self._ensure_cache_dir()
+            tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(json_dumps(suggestions))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning("Could not write suggestion cache: %s", e)
     
     def execute(self, analysis_data: Dict[str, Any], user_preferences: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Generate personalized investment suggestions based on analysis and preferences"""
         logger.info(f"{self.name}: Generating personalized investment suggestions...")
         
         if analysis_data.get('status') != 'success':
-            return {
-                'status': 'error',
-                'error': 'Invalid analysis data provided'
-            }
+            return dict(_INVALID_INPUT_RESPONSE)
         
         try:
             analysis = analysis_data.get('analysis', {})
@@ -36,18 +279,42 @@ class SuggestionEngineAgent:
                     logger.warning("No user preferences found, using default profile")
                     user_preferences = self._get_default_preferences()
             
+            # Identical analysis + preferences produce the same prompt, so a
+            # cached parse is as good as a fresh Gemini call - and free
+            digest = self._input_digest(analysis, user_preferences)
+            cache_path = None if digest is None else os.path.join(self._cache_dir, f"{digest}.json")
+            if cache_path and os.path.exists(cache_path):
+                try:
+                    with open(cache_path, 'rb') as f:
+                        suggestions_result = json_loads(f.read())
+                    suggestions_result['user_preferences_applied'] = user_preferences
+                    logger.info(f"{self.name}: Serving suggestions from cache")
+                    return {
+                        'status': 'success',
+                        'suggestions': suggestions_result,
+                        'raw_suggestions': 'Served from suggestion cache',
+                        'timestamp': self._get_timestamp()
+                    }
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not read suggestion cache: %s", e)
+
             # Create personalized suggestion prompt
             prompt = self._create_personalized_suggestion_prompt(analysis, user_preferences)
-            
+
             # Generate suggestions using rate-limited handler
             suggestions_text = gemini_handler.generate_content_with_retry(prompt)
-            
+
             if not suggestions_text:
                 return self._create_fallback_suggestions_response(analysis, user_preferences, "No API response")
-            
+
             # Parse suggestions with robust error handling
             suggestions_result = self._robust_suggestions_parse(suggestions_text, analysis, user_preferences)
-            
+
+            # Cache only genuine LLM output - fallbacks carry a fallback_note
+            # and should be retried next run, not pinned to disk
+            if cache_path and 'fallback_note' not in suggestions_result:
+                self._store_cached_suggestions(cache_path, suggestions_result)
+
             # CRITICAL: Add user preferences to response for report generation
             suggestions_result['user_preferences_applied'] = user_preferences
             
@@ -65,280 +332,227 @@ class SuggestionEngineAgent:
             analysis = analysis_data.get('analysis', {})
             return self._create_fallback_suggestions_response(analysis, user_preferences or {}, str(e))
     
-    def _create_personalized_suggestion_prompt(self, analysis: dict, preferences: dict) -> str:
-        """Create personalized suggestion prompt based on user preferences"""
-        exec_summary = analysis.get('executive_summary', {})
-        
-        # Extract user preferences
-        goals = preferences.get('investment_goals', {})
-        risk_prefs = preferences.get('risk_preferences', {})
-        portfolio_prefs = preferences.get('portfolio_preferences', {})
-        constraints = preferences.get('constraints', {})
-        basic_info = preferences.get('basic_info', {})
-        
-        return f"""
-You are a personalized investment advisor. Create investment suggestions based on the portfolio analysis AND the specific user preferences provided.
+    def execute_batch(self, items: List) -> List[Dict[str, Any]]:
+        """Generate suggestions for several portfolios concurrently.
 
-PORTFOLIO ANALYSIS:
-- Investment: ₹{exec_summary.get('total_investment', 0):.0f}
-- P&L: {exec_summary.get('total_pnl_percentage', 0):+.2f}%
-- Holdings: {exec_summary.get('number_of_holdings', 0)}
+        Each item is either an analysis dict or an (analysis_data,
+        user_preferences) tuple. The Gemini calls are network-bound, so
+        overlapping them on a thread pool makes batch latency roughly one
+        round trip instead of N; per-call rate limiting still happens
+        inside gemini_handler. Results come back in input order.
+        """
+        if not items:
+            return []
 
-USER PROFILE & PREFERENCES:
-- Age: {basic_info.get('age', 'N/A')} | Experience: {basic_info.get('experience_level', 'N/A')}
-- Primary Goal: {goals.get('primary_goal', 'Wealth Creation')}
-- Time Horizon: {goals.get('time_horizon', 'Long-term')}
-- Risk Tolerance: {risk_prefs.get('risk_tolerance', 'Moderate')}
-- Expected Return: {goals.get('expected_return', 12)}%
-- Equity Preference: {portfolio_prefs.get('preferred_equity_allocation', 70)}%
-- Monthly Addition: ₹{goals.get('monthly_addition', 0)}
-- Additional Budget: ₹{constraints.get('additional_investment_budget', 0)}
-- Preferred Sectors: {', '.join(portfolio_prefs.get('preferred_sectors', []))}
-- Avoid Sectors: {', '.join(constraints.get('avoid_sectors', []))}
-- Portfolio Size Preference: {portfolio_prefs.get('diversification_preference', 8)} holdings
-- Existing Portfolio Action: {constraints.get('existing_portfolio_action', 'modify')}
+        def run(item):
+            if isinstance(item, tuple):
+                return self.execute(*item)
+            return self.execute(item)
 
-Return suggestions in JSON format that specifically address:
-1. How to handle existing portfolio based on user preference
-2. New investments aligned with preferred sectors and risk tolerance
-3. Implementation considering monthly additions and additional budget
-4. Risk management appropriate for user's risk tolerance
+        with ThreadPoolExecutor(max_workers=min(8, len(items))) as executor:
+            return list(executor.map(run, items))
 
-{{
-  "personalized_analysis": {{
-    "alignment_with_goals": "How current portfolio aligns with user goals",
-    "risk_assessment": "Portfolio risk vs user risk tolerance",
-    "gap_analysis": "What's missing based on preferences"
-  }},
-  "existing_portfolio_action": {{
-    "recommendation": "hold/modify/partial_exit based on user preference",
-    "rationale": "Why this action suits user profile",
-    "specific_changes": ["Specific changes to make"]
-  }},
-  "new_investments": [
-    {{
-      "symbol": "STOCK_SYMBOL",
-      "sector": "Sector from preferred list",
-      "allocation_amount": "Amount in ₹",
-      "allocation_percentage": "% of total portfolio",
-      "rationale": "Why this fits user preferences",
-      "priority": "High/Medium/Low",
-      "timeline": "When to invest"
-    }}
-  ],
-  "implementation_strategy": {{
-    "phase_1_immediate": {{
-      "budget_required": "₹ needed for immediate actions",
-      "actions": ["Immediate steps"],
-      "timeframe": "Timeline"
-    }},
-    "phase_2_monthly_sip": {{
-      "monthly_amount": "{goals.get('monthly_addition', 0)}",
-      "allocation_split": {{"sector1": "percentage", "sector2": "percentage"}},
-      "duration": "How long to continue SIP"
-    }},
-    "phase_3_additional_corpus": {{
-      "when_to_deploy": "Timing for additional ₹{constraints.get('additional_investment_budget', 0)}",
-      "deployment_strategy": "How to invest additional corpus"
-    }}
-  }},
-  "risk_management": {{
-    "position_sizing": "Max % per holding based on risk tolerance",
-    "stop_loss_strategy": "Appropriate for user risk profile",
-    "rebalancing_frequency": "Based on user involvement preference",
-    "emergency_fund": "Liquidity requirements based on user needs"
-  }},
-  "goal_alignment": {{
-    "target_corpus": "{goals.get('target_corpus', 5000000)}",
-    "expected_timeline": "Time to reach target",
-    "probability_of_success": "Based on expected returns and risk",
-    "adjustments_needed": "If goals seem unrealistic"
-  }}
-}}
+    def _create_personalized_suggestion_prompt(self, analysis: dict, preferences: dict) -> str:
+        """Create personalized suggestion prompt based on user preferences"""
+        # Bind each group's .get to a local once, as _build_user_context does
+        # in the report agent - the slot fills below skip the repeated
+        # attribute resolution
+        summ = analysis.get('executive_summary', {}).get
+        goal = preferences.get('investment_goals', {}).get
+        risk = preferences.get('risk_preferences', {}).get
+        pref = preferences.get('portfolio_preferences', {}).get
+        limit = preferences.get('constraints', {}).get
+        basic = preferences.get('basic_info', {}).get
 
-Ensure all recommendations are specifically tailored to the user's preferences, constraints, and goals.
-"""
+        return _SUGGESTION_PROMPT_TMPL.substitute(
+            total_investment=f"{summ('total_investment', 0):.0f}",
+            pnl_percentage=f"{summ('total_pnl_percentage', 0):+.2f}",
+            holdings_count=summ('number_of_holdings', 0),
+            age=basic('age', 'N/A'),
+            experience_level=basic('experience_level', 'N/A'),
+            primary_goal=goal('primary_goal', 'Wealth Creation'),
+            time_horizon=goal('time_horizon', 'Long-term'),
+            risk_tolerance=risk('risk_tolerance', 'Moderate'),
+            expected_return=goal('expected_return', 12),
+            equity_preference=pref('preferred_equity_allocation', 70),
+            monthly_addition=goal('monthly_addition', 0),
+            additional_budget=limit('additional_investment_budget', 0),
+            preferred_sectors=', '.join(pref('preferred_sectors', [])),
+            avoid_sectors=', '.join(limit('avoid_sectors', [])),
+            diversification_preference=pref('diversification_preference', 8),
+            existing_action=limit('existing_portfolio_action', 'modify'),
+            target_corpus=goal('target_corpus', 5000000)
+        )
     
     def _robust_suggestions_parse(self, text: str, analysis: Dict, preferences: Dict) -> Dict:
         """Parse suggestions with user preferences context"""
+        # Common case first: Gemini usually returns valid bare JSON, so try
+        # a direct parse before paying for the cleanup pipeline
+        if text:
+            try:
+                return json_loads(text)
+            except json.JSONDecodeError:
+                pass
+
+            # Markdown-fenced responses: the capture isolates the object, so
+            # a hit skips the comment/comma cleanup below
+            fenced = _RE_FENCE_BLOCK.search(text)
+            if fenced:
+                try:
+                    return json_loads(fenced.group(1))
+                except json.JSONDecodeError:
+                    pass
+
         try:
-            # Clean and parse
+            # Clean and parse; json_loads goes through orjson when installed
+            # (its JSONDecodeError subclasses the stdlib one)
             cleaned_text = self._clean_json_text(text)
             if cleaned_text:
-                return json.loads(cleaned_text)
-                
+                return json_loads(cleaned_text)
+
         except json.JSONDecodeError as e:
             logger.warning(f"Suggestions JSON parse failed: {e}")
-        
+
         # Fallback: Create personalized structured suggestions
         return self._create_personalized_suggestions_fallback(analysis, preferences, text)
     
     def _create_personalized_suggestions_fallback(self, analysis: Dict, preferences: Dict, raw_text: str) -> Dict:
         """Create personalized suggestions fallback based on user preferences"""
-        exec_summary = analysis.get('executive_summary', {})
-        goals = preferences.get('investment_goals', {})
-        risk_prefs = preferences.get('risk_preferences', {})
-        portfolio_prefs = preferences.get('portfolio_preferences', {})
-        constraints = preferences.get('constraints', {})
-        
+        # Same bound-.get destructure as the prompt builder: every value the
+        # sections below need is resolved into a local exactly once
+        summ = analysis.get('executive_summary', {}).get
+        goal = preferences.get('investment_goals', {}).get
+        risk = preferences.get('risk_preferences', {}).get
+        pref = preferences.get('portfolio_preferences', {}).get
+        limit = preferences.get('constraints', {}).get
+
         # Determine suggestions based on preferences
-        preferred_sectors = portfolio_prefs.get('preferred_sectors', [])
-        avoid_sectors = constraints.get('avoid_sectors', [])
-        risk_level = risk_prefs.get('risk_score', 3)
-        additional_budget = constraints.get('additional_investment_budget', 0)
-        monthly_addition = goals.get('monthly_addition', 0)
-        
-        # Create sector-appropriate suggestions
-        investment_ideas = []
-        
-        # Conservative suggestions for lower risk tolerance
-        if risk_level <= 2:
-            safe_stocks = [
-                {"symbol": "HDFCBANK", "sector": "Banking", "rationale": "Stable large-cap banking leader"},
-                {"symbol": "HINDUNILVR", "sector": "FMCG", "rationale": "Defensive consumer goods"},
-                {"symbol": "NESTLEIND", "sector": "FMCG", "rationale": "Quality consumer brand"}
-            ]
-            investment_ideas.extend(safe_stocks)
-        
-        # Moderate to aggressive suggestions
-        elif risk_level >= 3:
-            growth_stocks = [
-                {"symbol": "RELIANCE", "sector": "Energy", "rationale": "Diversified conglomerate"},
-                {"symbol": "HCLTECH", "sector": "IT", "rationale": "Technology growth potential"},
-                {"symbol": "ASIANPAINT", "sector": "Consumer", "rationale": "Market leader in paints"}
-            ]
-            investment_ideas.extend(growth_stocks)
+        preferred_sectors = pref('preferred_sectors', [])
+        avoid_sectors = limit('avoid_sectors', [])
+        risk_level = risk('risk_score', 3)
+        additional_budget = limit('additional_investment_budget', 0)
+        monthly_addition = goal('monthly_addition', 0)
+        primary_goal = goal('primary_goal', 'wealth creation')
+        risk_tolerance = risk('risk_tolerance', 'moderate')
+        existing_action = limit('existing_portfolio_action', 'modify')
+        target_corpus = goal('target_corpus', 5000000)
+        expected_return = goal('expected_return', 12)
         
-        # Filter based on sector preferences
+        # Pick the risk-appropriate stock pool, narrowed to preferred
+        # sectors when the narrowing leaves anything
+        source = _SAFE_STOCKS if risk_level <= 2 else _GROWTH_STOCKS
+
         if preferred_sectors:
-            filtered_ideas = []
-            for idea in investment_ideas:
-                if any(pref_sector.lower() in idea['sector'].lower() for pref_sector in preferred_sectors):
-                    filtered_ideas.append(idea)
-            if filtered_ideas:
-                investment_ideas = filtered_ideas
-        
-        # Add allocation amounts based on budget
-        for i, idea in enumerate(investment_ideas):
-            if additional_budget > 0:
-                idea['allocation_amount'] = additional_budget // max(len(investment_ideas), 1)
-                idea['allocation_percentage'] = (idea['allocation_amount'] / max(exec_summary.get('current_value', 100000) + additional_budget, 1)) * 100
-            else:
-                idea['allocation_amount'] = monthly_addition * 3  # 3 months worth
-                idea['allocation_percentage'] = 10  # Default percentage
-            
-            idea['priority'] = "High" if i < 2 else "Medium"
-            idea['timeline'] = "Immediate" if additional_budget > 0 else "Via SIP"
+            # Lowercase the preferences once, not per idea; substring match
+            # is kept so 'Banking' still matches 'Banking & Finance'
+            pref_lower = tuple(pref_sector.lower() for pref_sector in preferred_sectors)
+            filtered = tuple(
+                idea for idea in source
+                if any(pref in idea['sector'].lower() for pref in pref_lower)
+            )
+            if filtered:
+                source = filtered
+
+        # Allocation is uniform across the ideas, so compute it once and
+        # build each final dict in a single merge instead of mutating in
+        # a second loop
+        if additional_budget > 0:
+            allocation_amount = additional_budget // max(len(source), 1)
+            allocation_percentage = (allocation_amount / max(summ('current_value', 100000) + additional_budget, 1)) * 100
+            timeline = "Immediate"
+        else:
+            allocation_amount = monthly_addition * 3  # 3 months worth
+            allocation_percentage = 10  # Default percentage
+            timeline = "Via SIP"
+
+        investment_ideas = [
+            {**base,
+             'allocation_amount': allocation_amount,
+             'allocation_percentage': allocation_percentage,
+             'priority': "High" if i < 2 else "Medium",
+             'timeline': timeline}
+            for i, base in enumerate(source)
+        ]
         
-        return {
-            "personalized_analysis": {
-                "alignment_with_goals": f"Current portfolio needs diversification to align with {goals.get('primary_goal', 'wealth creation')} goal",
-                "risk_assessment": f"Portfolio risk level needs adjustment for {risk_prefs.get('risk_tolerance', 'moderate')} risk tolerance",
-                "gap_analysis": f"Missing diversification across preferred sectors: {', '.join(preferred_sectors)}"
-            },
-            "existing_portfolio_action": {
-                "recommendation": constraints.get('existing_portfolio_action', 'modify'),
-                "rationale": f"Based on your preference to {constraints.get('existing_portfolio_action', 'modify')} existing holdings",
-                "specific_changes": [
-                    f"Reduce concentration to maximum {20 if risk_level <= 2 else 25}% per holding",
-                    "Gradual rebalancing over 2-3 months to minimize market impact"
-                ]
-            },
-            "new_investments": investment_ideas[:4],  # Limit to top 4 suggestions
-            "implementation_strategy": {
-                "phase_1_immediate": {
-                    "budget_required": additional_budget,
-                    "actions": [
-                        "Deploy additional corpus in chosen stocks",
-                        "Set up systematic investment plan"
-                    ],
-                    "timeframe": "Next 2 weeks"
-                },
-                "phase_2_monthly_sip": {
-                    "monthly_amount": monthly_addition,
-                    "allocation_split": {
-                        "Large Cap": 60 if risk_level <= 2 else 50,
-                        "Mid Cap": 30 if risk_level <= 2 else 35,
-                        "Small Cap": 10 if risk_level <= 2 else 15
-                    },
-                    "duration": "12-24 months for full deployment"
-                },
-                "phase_3_additional_corpus": {
-                    "when_to_deploy": "Stagger over 3-6 months" if additional_budget > 50000 else "Deploy immediately",
-                    "deployment_strategy": "Dollar cost averaging to reduce timing risk"
-                }
-            },
-            "risk_management": {
-                "position_sizing": f"Maximum {20 if risk_level <= 2 else 25}% per stock",
-                "stop_loss_strategy": f"{10 if risk_level <= 2 else 15}% stop loss based on risk tolerance",
-                "rebalancing_frequency": "Quarterly review with annual rebalancing",
-                "emergency_fund": "Maintain 6 months expenses before additional investments"
-            },
-            "goal_alignment": {
-                "target_corpus": goals.get('target_corpus', 5000000),
-                "expected_timeline": f"{((goals.get('target_corpus', 5000000) - exec_summary.get('current_value', 0)) / max(monthly_addition * 12 + additional_budget, 1)) if monthly_addition > 0 else 10:.0f} years",
-                "probability_of_success": "High" if goals.get('expected_return', 12) <= 15 else "Moderate",
-                "adjustments_needed": "Goals are realistic with consistent investing" if goals.get('expected_return', 12) <= 15 else "Consider more conservative return expectations"
-            },
-            "preferences_applied": {
-                "sectors_focused": preferred_sectors,
-                "sectors_avoided": avoid_sectors,
-                "risk_alignment": f"Suggestions match {risk_prefs.get('risk_tolerance', 'moderate')} risk profile",
-                "budget_utilization": f"₹{additional_budget:,} additional + ₹{monthly_addition:,} monthly considered"
-            },
-            "fallback_note": "Personalized recommendations based on user preferences and portfolio analysis"
+        # Clone the pre-serialized skeleton and patch only the dynamic slots
+        result = json_loads(_FALLBACK_SUGGESTIONS_PROTO_JSON)
+        conservative = risk_level <= 2
+        max_position = 20 if conservative else 25
+
+        result["personalized_analysis"].update(
+            alignment_with_goals=f"Current portfolio needs diversification to align with {primary_goal} goal",
+            risk_assessment=f"Portfolio risk level needs adjustment for {risk_tolerance} risk tolerance",
+            gap_analysis=f"Missing diversification across preferred sectors: {', '.join(preferred_sectors)}"
+        )
+
+        action = result["existing_portfolio_action"]
+        action["recommendation"] = existing_action
+        action["rationale"] = f"Based on your preference to {existing_action} existing holdings"
+        action["specific_changes"][0] = f"Reduce concentration to maximum {max_position}% per holding"
+
+        result["new_investments"] = investment_ideas[:4]  # Limit to top 4 suggestions
+
+        strategy = result["implementation_strategy"]
+        strategy["phase_1_immediate"]["budget_required"] = additional_budget
+        strategy["phase_2_monthly_sip"]["monthly_amount"] = monthly_addition
+        strategy["phase_2_monthly_sip"]["allocation_split"] = {
+            "Large Cap": 60 if conservative else 50,
+            "Mid Cap": 30 if conservative else 35,
+            "Small Cap": 10 if conservative else 15
         }
+        strategy["phase_3_additional_corpus"]["when_to_deploy"] = (
+            "Stagger over 3-6 months" if additional_budget > 50000 else "Deploy immediately"
+        )
+
+        result["risk_management"].update(
+            position_sizing=f"Maximum {max_position}% per stock",
+            stop_loss_strategy=f"{10 if conservative else 15}% stop loss based on risk tolerance"
+        )
+
+        realistic = expected_return <= 15
+        result["goal_alignment"].update(
+            target_corpus=target_corpus,
+            expected_timeline=f"{((target_corpus - summ('current_value', 0)) / max(monthly_addition * 12 + additional_budget, 1)) if monthly_addition > 0 else 10:.0f} years",
+            probability_of_success="High" if realistic else "Moderate",
+            adjustments_needed="Goals are realistic with consistent investing" if realistic else "Consider more conservative return expectations"
+        )
+
+        result["preferences_applied"].update(
+            sectors_focused=preferred_sectors,
+            sectors_avoided=avoid_sectors,
+            risk_alignment=f"Suggestions match {risk_tolerance} risk profile",
+            budget_utilization=f"₹{additional_budget:,} additional + ₹{monthly_addition:,} monthly considered"
+        )
+
+        return result
     
     def _get_default_preferences(self) -> Dict[str, Any]:
         """Return default preferences if none are found"""
-        return {
-            'investment_goals': {
-                'primary_goal': 'Wealth Creation',
-                'time_horizon': 'Long-term (5-10 years)',
-                'expected_return': 12.0,
-                'monthly_addition': 10000,
-                'target_corpus': 5000000
-            },
-            'risk_preferences': {
-                'risk_tolerance': 'Moderate (Balanced growth)',
-                'risk_score': 3,
-                'max_acceptable_drawdown': 15.0
-            },
-            'portfolio_preferences': {
-                'preferred_equity_allocation': 70,
-                'preferred_sectors': [],
-                'diversification_preference': 8
-            },
-            'constraints': {
-                'additional_investment_budget': 0,
-                'avoid_sectors': [],
-                'existing_portfolio_action': 'modify'
-            },
-            'basic_info': {
-                'age': 35,
-                'experience_level': 'Intermediate'
-            }
-        }
+        # Clone the pre-serialized prototype instead of rebuilding the
+        # ~30 nested dict/list literals on every call
+        return json_loads(_DEFAULT_PREFS_PROTO_JSON)
     
     def _clean_json_text(self, text: str) -> str:
-        """Clean text for JSON parsing"""
+        """Clean text for JSON parsing.
+
+        Uses the shared linear scanners from utils.json_utils: one
+        string-aware pass drops // comments (without mangling URLs the
+        old regex ate), one balanced-brace pass isolates the object.
+        Only the short trailing-comma fixups remain as regexes.
+        """
         if not text:
             return ""
-            
+
         # Remove markdown code blocks
-        text = re.sub(r'```', '', text)
-        
-        start = text.find('{')
-        end = text.rfind('}')
-        
-        if start == -1 or end == -1 or end <= start:
+        text = _RE_FENCE.sub('', text)
+
+        json_text = extract_first_json(strip_line_comments(text))
+        if json_text is None:
             return ""
-            
-        json_text = text[start:end+1]
-        json_text = re.sub(r'//.*?\n', '\n', json_text)
-        json_text = re.sub(r',\s*}', '}', json_text)
-        json_text = re.sub(r',\s*]', ']', json_text)
-        
+
+        json_text = _RE_TRAIL_OBJ.sub('}', json_text)
+        json_text = _RE_TRAIL_ARR.sub(']', json_text)
+
         return json_text.strip()
     
     def _create_fallback_suggestions_response(self, analysis: Dict, preferences: Dict, error_msg: str) -> Dict[str, Any]:
@@ -355,5 +569,4 @@ Ensure all recommendations are specifically tailored to the user's preferences,
         }
     
     def _get_timestamp(self) -> str:
-        from datetime import datetime
         return datetime.now().isoformat()
@@ -15,6 +15,9 @@ class Config:
     # User Preferences
     INVESTMENT_PROFILE = os.getenv('INVESTMENT_PROFILE', 'moderate_risk_long_term')
     REPORT_FORMAT = os.getenv('REPORT_FORMAT', 'markdown')
+
+    # Performance tuning
+    FETCH_CACHE_TTL = int(os.getenv('FETCH_CACHE_TTL', '30'))  # seconds
     
     # Validation
     REQUIRED_VARS = [
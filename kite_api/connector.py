@@ -1,24 +1,53 @@
 from kiteconnect import KiteConnect
 import logging
+import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config.settings import Config
 from typing import Dict, List, Optional
 import pandas as pd
 
+from utils.json_utils import dumps as json_dumps, loads as json_loads
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared pooled session configuration - reusing keep-alive connections avoids
+# paying TCP + TLS setup on every one of the back-to-back API calls
+_POOLED_ADAPTER = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504]
+    )
+)
+
 class KiteAPIConnector:
     """Direct Kite Connect API connector"""
-    
+
     def __init__(self):
         self.config = Config()
         self.kite = KiteConnect(api_key=self.config.KITE_API_KEY)
-        
+        self._setup_pooled_session()
+
         # Set access token if available
         if self.config.KITE_ACCESS_TOKEN:
             self.kite.set_access_token(self.config.KITE_ACCESS_TOKEN)
         else:
             logger.warning("No access token found. Login flow required.")
+
+    def _setup_pooled_session(self):
+        """Mount a pooled HTTPAdapter with retry/backoff on the Kite session"""
+        session = getattr(self.kite, 'reqsession', None)
+        if isinstance(session, requests.Session):
+            session.mount('https://', _POOLED_ADAPTER)
+        else:
+            logger.warning("Kite session not available for connection pooling")
     
     def get_login_url(self) -> str:
         """Get login URL for authentication"""
@@ -70,21 +99,74 @@ class KiteAPIConnector:
             logger.error(f"Error fetching margins: {e}")
             return {}
     
+    # The instrument master is published once per trading day, so one
+    # download per exchange per day is enough - the dump is several MB and
+    # takes seconds to fetch and parse
+    _INSTRUMENTS_CACHE_DIR = os.path.join('.cache', 'instruments')
+
     def get_instruments(self, exchange: str = "NSE") -> List[Dict]:
-        """Fetch instruments list"""
+        """Fetch instruments list, cached on disk for the current day"""
+        cache_path = os.path.join(
+            self._INSTRUMENTS_CACHE_DIR,
+            f"{exchange}_{date.today().isoformat()}.json"
+        )
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    return json_loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read instruments cache: {e}")
+
         try:
-            return self.kite.instruments(exchange)
+            instruments = self.kite.instruments(exchange)
         except Exception as e:
             logger.error(f"Error fetching instruments: {e}")
             return []
+
+        # Serialize once and return the round-tripped rows, so the fresh
+        # fetch yields exactly what warm-cache calls will: kiteconnect
+        # hands back datetime.date expiry fields, and returning those raw
+        # would give callers dates on the first call of the day and ISO
+        # strings on every later one
+        payload = json_dumps(instruments)
+        try:
+            os.makedirs(self._INSTRUMENTS_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write instruments cache: {e}")
+
+        return json_loads(payload)
     
+    # Kite rejects quote requests for more than 500 instruments at once
+    _QUOTE_CHUNK_SIZE = 500
+
     def get_quote(self, instruments: List[str]) -> Dict:
-        """Get live quotes for instruments"""
-        try:
-            return self.kite.quote(instruments)
-        except Exception as e:
-            logger.error(f"Error fetching quotes: {e}")
-            return {}
+        """Get live quotes for instruments, chunking past the API's 500 cap.
+
+        Oversized lists are split into 500-instrument chunks fetched
+        concurrently on the pooled session, and the per-chunk dicts merged
+        back into one response. A failed chunk logs and contributes
+        nothing rather than sinking the whole call.
+        """
+        if len(instruments) <= self._QUOTE_CHUNK_SIZE:
+            try:
+                return self.kite.quote(instruments)
+            except Exception as e:
+                logger.error(f"Error fetching quotes: {e}")
+                return {}
+
+        chunks = [
+            instruments[i:i + self._QUOTE_CHUNK_SIZE]
+            for i in range(0, len(instruments), self._QUOTE_CHUNK_SIZE)
+        ]
+        quotes: Dict = {}
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as executor:
+            for chunk_quotes in executor.map(self.get_quote, chunks):
+                quotes.update(chunk_quotes)
+        return quotes
 
 def test_connection():
     """Test Kite API connection"""
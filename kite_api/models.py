@@ -0,0 +1,44 @@
+# kite_api/models.py
+"""Lightweight typed records for Kite API payloads."""
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+# dict-key -> attribute aliases so existing h.get('average_price') callers
+# keep working against the slotted record
+_HOLDING_KEY_ALIASES = {
+    'tradingsymbol': 'symbol',
+    'average_price': 'avg_price',
+    'last_price': 'last_price',
+    'quantity': 'qty',
+    'pnl': 'pnl',
+}
+
+
+@dataclass(slots=True, frozen=True)
+class Holding:
+    """One portfolio holding in slot storage.
+
+    Slots cut the per-record memory roughly in half versus the raw API
+    dict and make field access a fixed-offset load instead of a hash
+    lookup on the hot aggregation paths.
+    """
+    symbol: str
+    avg_price: float
+    last_price: float
+    qty: int
+    pnl: float
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "Holding":
+        return cls(
+            symbol=raw.get('tradingsymbol', ''),
+            avg_price=float(raw.get('average_price', 0) or 0),
+            last_price=float(raw.get('last_price', 0) or 0),
+            qty=int(raw.get('quantity', 0) or 0),
+            pnl=float(raw.get('pnl', 0) or 0),
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style access shim for consumers written against raw dicts"""
+        return getattr(self, _HOLDING_KEY_ALIASES.get(key, key), default)
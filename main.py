@@ -1,4 +1,3 @@
-# main.py - Updated version with preference agent
 #!/usr/bin/env python3
 """
 Portfolio Analysis Multi-Agent System with User Preference Collection
@@ -6,21 +5,17 @@ Portfolio Analysis Multi-Agent System with User Preference Collection
 
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.panel import Panel
 from rich.table import Table
 
 from config.settings import check_config
-from agents.preference_agent import UserPreferenceAgent
-from agents.fetcher_agent import PortfolioFetcherAgent
-from agents.analyzer_agent import DataAnalyzerAgent  
-from agents.suggestion_agent import SuggestionEngineAgent
-from agents.report_agent import ReportGeneratorAgent
 
-# Setup logging
+# Setup logging (--verbose enables the deferred logger.debug diagnostics)
 logging.basicConfig(
-    level=logging.INFO,
+    level=logging.DEBUG if '--verbose' in sys.argv else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler('portfolio_analyzer.log'),
@@ -36,6 +31,15 @@ class PortfolioAnalysisOrchestrator:
     """Main orchestrator with user preference collection"""
     
     def __init__(self):
+        # Imported here rather than at module top: the agent modules pull in
+        # the Gemini and Kite SDKs plus numpy, so deferring them gets the
+        # banner and config check on screen before that cost is paid
+        from agents.preference_agent import UserPreferenceAgent
+        from agents.fetcher_agent import PortfolioFetcherAgent
+        from agents.analyzer_agent import DataAnalyzerAgent
+        from agents.suggestion_agent import SuggestionEngineAgent
+        from agents.report_agent import ReportGeneratorAgent
+
         self.preference_agent = UserPreferenceAgent()
         self.fetcher = PortfolioFetcherAgent()
         self.analyzer = DataAnalyzerAgent()
@@ -46,14 +50,21 @@ class PortfolioAnalysisOrchestrator:
         """Execute complete portfolio analysis workflow with preference collection"""
         console.print(Panel.fit("🚀 Personalized Portfolio Analysis Multi-Agent System", style="bold blue"))
         
+        # The Kite fetch is independent of the interactive questionnaire, so
+        # start it in the background - by the time the user finishes
+        # answering, the portfolio data is usually already in hand
+        prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        prefetch = prefetch_pool.submit(self.fetcher.execute)
+        prefetch_pool.shutdown(wait=False)
+
         # Step 0: Collect User Preferences (New!)
         console.print("\n🎯 Step 1: Collecting Your Investment Preferences", style="bold yellow")
         user_preferences = self.preference_agent.execute()
-        
+
         if user_preferences.get('status') != 'success':
             console.print("❌ Preference collection failed or was cancelled", style="bold red")
             return False
-        
+
         console.print("✅ User preferences collected successfully!")
         
         with Progress(
@@ -63,9 +74,10 @@ class PortfolioAnalysisOrchestrator:
             transient=True,
         ) as progress:
             
-            # Step 1: Fetch Portfolio Data
+            # Step 1: Fetch Portfolio Data (started before the questionnaire;
+            # this just waits for whatever is still in flight)
             task1 = progress.add_task("Fetching portfolio data...", total=None)
-            portfolio_data = self.fetcher.execute()
+            portfolio_data = prefetch.result()
             progress.update(task1, completed=True)
             
             if portfolio_data.get('status') != 'success':
@@ -92,12 +104,10 @@ class PortfolioAnalysisOrchestrator:
 
             if suggestions_result.get('status') != 'success':
                 console.print("❌ Suggestion generation failed", style="bold red")
-                # Print debug info to see what went wrong
-                console.print(f"Debug: Suggestions error - {suggestions_result.get('error', 'Unknown error')}")
+                logger.debug("Suggestions error - %s", suggestions_result.get('error', 'Unknown error'))
                 return False
 
-            # Debug: Check if suggestions were generated
-            console.print(f"🔍 Debug: Suggestions status - {suggestions_result.get('status')}")
+            logger.debug("Suggestions status - %s", suggestions_result.get('status'))
 
             # Step 4: Generate Report
             task4 = progress.add_task("Generating personalized report...", total=None)
@@ -107,9 +117,15 @@ class PortfolioAnalysisOrchestrator:
                 
                 if report_result.get('status') != 'success':
                     console.print("❌ Report generation failed", style="bold red")
-                    console.print(f"Debug: Report error - {report_result.get('error', 'Unknown error')}")
+                    logger.debug("Report error - %s", report_result.get('error', 'Unknown error'))
                     return False
-                    
+
+                # The report is written in the background; wait for it to
+                # land (re-raising any write failure) before telling the
+                # user where the file is
+                self.reporter.flush()
+
+
             except Exception as e:
                 console.print(f"❌ Report generation exception: {e}", style="bold red")
                 logger.exception("Report generation failed")
@@ -1,53 +1,89 @@
 # utils/api_handler.py
 import time
 import logging
+import threading
 import google.generativeai as genai
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from config.settings import Config
 
 logger = logging.getLogger(__name__)
 
 class RateLimitedGeminiHandler:
     """Handler for Gemini API calls with rate limiting"""
-    
+
+    # Conservative settings for the free tier
+    _GENERATION_DEFAULTS = {
+        'temperature': 0.3,
+        'top_p': 0.8,
+        'max_output_tokens': 2048,
+    }
+
     def __init__(self, model_name: str = 'gemini-1.5-flash', max_retries: int = 3):
         self.model_name = model_name
         self.max_retries = max_retries
-        self.last_request_time = 0
-        self.min_request_interval = 1  # 1 second between requests
+        self.min_request_interval = 1  # refill: one send per second sustained
+        self._bucket_capacity = 4  # small bursts go straight through
+        self._tokens = float(self._bucket_capacity)
+        self._bucket_updated = time.monotonic()
+        self._rate_lock = threading.Lock()  # guards the bucket fields above
         
         # Initialize Gemini
         config = Config()
         genai.configure(api_key=config.GEMINI_API_KEY)
         self.model = genai.GenerativeModel(model_name)
-    
+
+        # Built once - every call without overrides reuses this instead of
+        # reconstructing an identical config per attempt
+        self._default_generation_config = genai.types.GenerationConfig(
+            **self._GENERATION_DEFAULTS
+        )
+
+    def _reserve_send_slot(self) -> float:
+        """Take one token from the bucket, returning how long to wait first.
+
+        Classic token bucket: tokens refill at 1/min_request_interval per
+        second up to a small burst capacity, so a handful of back-to-back
+        calls (the batch paths) pass without sleeping while sustained
+        traffic still averages out to the configured interval. When the
+        bucket runs dry the caller owes the refill time for the token it
+        just took; reserving under the lock keeps concurrent callers
+        correctly spaced.
+        """
+        with self._rate_lock:
+            now = time.monotonic()
+            rate = 1.0 / self.min_request_interval
+            self._tokens = min(
+                self._bucket_capacity,
+                self._tokens + (now - self._bucket_updated) * rate
+            )
+            self._bucket_updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / rate
+
     def generate_content_with_retry(self, prompt: str, **kwargs) -> Optional[str]:
         """Generate content with rate limiting and retry logic"""
-        
+
         for attempt in range(self.max_retries):
             try:
-                # Rate limiting
-                current_time = time.time()
-                time_since_last = current_time - self.last_request_time
-                
-                if time_since_last < self.min_request_interval:
-                    sleep_time = self.min_request_interval - time_since_last
+                sleep_time = self._reserve_send_slot()
+                if sleep_time > 0:
                     logger.info(f"Rate limiting: waiting {sleep_time:.2f} seconds")
                     time.sleep(sleep_time)
                 
-                # Configure for free tier
-                generation_config = genai.types.GenerationConfig(
-                    temperature=0.3,
-                    top_p=0.8,
-                    max_output_tokens=2048,  # Conservative for free tier
-                    **kwargs
-                )
-                
+                # Only overridden calls pay for a fresh config object
+                if kwargs:
+                    generation_config = genai.types.GenerationConfig(
+                        **{**self._GENERATION_DEFAULTS, **kwargs}
+                    )
+                else:
+                    generation_config = self._default_generation_config
+
                 logger.info(f"Sending request to {self.model_name} (attempt {attempt + 1})")
                 response = self.model.generate_content(prompt, generation_config=generation_config)
-                
-                self.last_request_time = time.time()
-                
+
                 if response and response.text:
                     logger.info(f"Successfully received response")
                     return response.text.strip()
@@ -62,7 +98,11 @@ class RateLimitedGeminiHandler:
                     sleep_time = min(30 * (attempt + 1), 120)  # Max 2 minutes
                     logger.warning(f"Rate limit hit. Waiting {sleep_time} seconds...")
                     time.sleep(sleep_time)
-                    self.min_request_interval = max(self.min_request_interval * 1.5, 3)
+                    with self._rate_lock:
+                        self.min_request_interval = max(self.min_request_interval * 1.5, 3)
+                        # Drain any banked burst credit - right after a quota
+                        # error is the worst time to fire a burst
+                        self._tokens = min(self._tokens, 0.0)
                 elif attempt == self.max_retries - 1:
                     raise e
                 else:
@@ -70,5 +110,24 @@ class RateLimitedGeminiHandler:
         
         return None
 
+    def generate_content_batch(self, prompts: List[str], **kwargs) -> List[Optional[str]]:
+        """Generate content for several independent prompts concurrently.
+
+        The HTTP round-trips overlap while the shared rate limiter still
+        spaces out the actual sends, so N prompts cost ~N * interval wall
+        clock instead of N * (interval + round-trip).
+        """
+        if not prompts:
+            return []
+        if len(prompts) == 1:
+            return [self.generate_content_with_retry(prompts[0], **kwargs)]
+
+        with ThreadPoolExecutor(max_workers=min(len(prompts), 4)) as executor:
+            futures = [
+                executor.submit(self.generate_content_with_retry, prompt, **kwargs)
+                for prompt in prompts
+            ]
+            return [future.result() for future in futures]
+
 # Global handler
 gemini_handler = RateLimitedGeminiHandler()
@@ -0,0 +1,121 @@
+# utils/json_utils.py
+"""Shared helpers for parsing and extracting JSON payloads from LLM responses."""
+
+import json
+from typing import Any, Optional
+
+# Prefer orjson (C-accelerated) when available; its JSONDecodeError is a
+# subclass of json.JSONDecodeError, so callers' except clauses keep working
+try:
+    import orjson as _fast_json
+
+    def loads(data: Any) -> Any:
+        """Parse JSON with orjson when installed, stdlib json otherwise"""
+        return _fast_json.loads(data)
+
+    def dumps_pretty(obj: Any) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes (orjson or stdlib)"""
+        return _fast_json.dumps(obj, option=_fast_json.OPT_INDENT_2, default=str)
+
+    def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes (orjson or stdlib)"""
+        option = _fast_json.OPT_SORT_KEYS if sort_keys else 0
+        return _fast_json.dumps(obj, option=option, default=str)
+
+except ImportError:
+    def loads(data: Any) -> Any:
+        """Parse JSON with orjson when installed, stdlib json otherwise"""
+        return json.loads(data)
+
+    def dumps_pretty(obj: Any) -> bytes:
+        """Serialize to indented UTF-8 JSON bytes (orjson or stdlib)"""
+        return json.dumps(obj, indent=2, default=str, ensure_ascii=False).encode('utf-8')
+
+    def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes (orjson or stdlib)"""
+        return json.dumps(
+            obj, separators=(',', ':'), sort_keys=sort_keys, default=str,
+            ensure_ascii=False
+        ).encode('utf-8')
+
+
+def strip_line_comments(text: str) -> str:
+    """Strip // line comments without touching string contents.
+
+    Single-pass scanner that tracks JSON string state, so values like
+    "http://..." survive - the old regex approach mangled them - and there
+    is no regex backtracking on newline-free inputs.
+    """
+    out = []
+    i = 0
+    n = len(text)
+    in_string = False
+    escaped = False
+
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch == '/' and i + 1 < n and text[i + 1] == '/':
+            newline = text.find('\n', i)
+            if newline == -1:
+                break
+            i = newline
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    return ''.join(out)
+
+
+def extract_first_json(text: str) -> Optional[str]:
+    """Extract the first balanced top-level JSON object from text.
+
+    Single linear scan tracking brace depth, string state and escapes -
+    strict O(n) where the nested-regex approach was O(n^2) worst-case on
+    large LLM outputs.
+    """
+    # Jump straight to the first brace with the C-level find instead of
+    # feeding leading prose through the per-character state machine
+    first = text.find('{')
+    if first == -1:
+        return None
+
+    depth = 0
+    start = -1
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text[first:], first):
+        if escaped:
+            escaped = False
+            continue
+        if ch == '\\':
+            escaped = in_string
+            continue
+        if ch == '"':
+            in_string = not in_string
+            continue
+        if in_string:
+            continue
+        if ch == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == '}':
+            if depth > 0:
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+
+    return None